@@ -2,6 +2,8 @@ import streamlit as st
 import sys
 import json
 from smartfunnel.crew import LatestAiDevelopmentCrew
+from smartfunnel.tools.chroma_db_init import creator_id_from_handle
+from smartfunnel.tools.instrumentation import format_run_report, run_report, write_run_report
 
 def validate_password(password):
     """
@@ -29,14 +31,15 @@ def save_output_to_markdown(crew_output, filename="creatorOutput.md"):
                 md_file.write(f"## Pydantic Output\n\n```\n{crew_output.pydantic}\n```\n\n")
             
             md_file.write(f"## Tasks Output\n\n```\n{crew_output.tasks_output}\n```\n\n")
-            md_file.write(f"## Token Usage\n\n```\n{crew_output.token_usage}\n```\n")
+            md_file.write(f"## Token Usage\n\n```\n{crew_output.token_usage}\n```\n\n")
+            md_file.write(f"## Calls by Task\n\n```\n{format_run_report(run_report())}\n```\n")
             
         return True
     except Exception as e:
         st.error(f"Error saving to markdown file: {str(e)}")
         return False
 
-def generate_markdown_content(crew_output):
+def generate_markdown_content(crew_output, report=None):
     """
     Generate markdown content from crew output
     """
@@ -52,6 +55,9 @@ def generate_markdown_content(crew_output):
     content += f"## Tasks Output\n\n```\n{crew_output.tasks_output}\n```\n\n"
     content += f"## Token Usage\n\n```\n{crew_output.token_usage}\n```\n"
     
+    if report:
+        content += f"\n## Calls by Task\n\n```\n{format_run_report(report)}\n```\n"
+    
     return content
 
 def main():
@@ -69,6 +75,8 @@ def main():
         st.session_state.analysis_complete = False
     if 'crew_output' not in st.session_state:
         st.session_state.crew_output = None
+    if 'run_report' not in st.session_state:
+        st.session_state.run_report = None
     
     if submit_button:
         # First validate password
@@ -81,15 +89,21 @@ def main():
                         "instagram_username": instagram_username
                     }
                     
+                    # The crew reads and writes the persistent collection of this creator only
+                    creator_id = creator_id_from_handle(youtube_handle or instagram_username)
+
                     # Run the crew
-                    crew_output = LatestAiDevelopmentCrew().crew().kickoff(inputs=inputs)
+                    crew_output = LatestAiDevelopmentCrew(creator_id).crew().kickoff(inputs=inputs)
                     
                     # Save output to session state
                     st.session_state.crew_output = crew_output
+                    # Calls of this session's run only (see tools/instrumentation.py)
+                    st.session_state.run_report = run_report()
                     st.session_state.analysis_complete = True
                     
                     # Save to file
                     save_output_to_markdown(crew_output)
+                    write_run_report()
                     
             except Exception as e:
                 st.error(f"An error occurred: {str(e)}")
@@ -102,7 +116,9 @@ def main():
         st.success("Analysis completed successfully!")
         
         # Create tabs for different outputs
-        tab1, tab2, tab3, tab4 = st.tabs(["Raw Output", "JSON Output", "Tasks Output", "Token Usage"])
+        tab1, tab2, tab3, tab4, tab5 = st.tabs(
+            ["Raw Output", "JSON Output", "Tasks Output", "Token Usage", "Calls by Task"]
+        )
         
         with tab1:
             st.code(st.session_state.crew_output.raw)
@@ -117,8 +133,12 @@ def main():
         with tab4:
             st.code(st.session_state.crew_output.token_usage)
         
+        with tab5:
+            if st.session_state.run_report:
+                st.code(format_run_report(st.session_state.run_report))
+        
         # Download button
-        markdown_content = generate_markdown_content(st.session_state.crew_output)
+        markdown_content = generate_markdown_content(st.session_state.crew_output, st.session_state.run_report)
         st.download_button(
             label="Download Results",
             data=markdown_content,
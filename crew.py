@@ -15,7 +15,6 @@ from crewai_tools import SerperDevTool
 from typing import List, Optional
 
 from crewai import Agent, Crew, Process, Task
-from crewai_tools import FirecrawlSearchTool
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from pydantic import BaseModel, Field
@@ -244,7 +243,7 @@ class ContentCreatorInfo(BaseModel):
 #         # If everything fails, return default ContentCreatorInfo
 #         return ContentCreatorInfo.default()
 
-from smartfunnel.tools.chroma_db_init import app_instance
+from smartfunnel.tools.chroma_db_init import DEFAULT_CREATOR_ID, app_for_creator
 # from smartfunnel.tools.QueryInstagramDBTool import QueryInstagramDBTool
 # from smartfunnel.tools.FetchInstagramPostsTool import FetchInstagramPostsTool, set_instagram_credentials
 # from smartfunnel.tools.FetchInstagramPostsTool import AddPostsToVectorDBTool
@@ -254,12 +253,30 @@ from smartfunnel.tools.FetchToAddInstagramAudioTool import FetchToAddInstagramAu
 from smartfunnel.tools.QueryInstagramDBTool import QueryInstagramDBTool
 # from smartfunnel.tools.FetchInstagramPostsTool import FetchInstagramPostsTool, AddPostsToVectorDBTool
 from smartfunnel.tools.QueryInstagramDBTool import QueryInstagramDBTool
+from smartfunnel.tools.instrumentation import start_run
+from smartfunnel.tools.settings import get_secret
+from functools import lru_cache
+
 # --- Tools ---
+# Tools are built on first use, once per creator, around that creator's
+# lazily built embedchain app, so importing this module creates no client.
 # fetch_latest_videos_tool = FetchLatestVideosFromYouTubeChannelTool()
-fetch_relevant_videos_tool = FetchRelevantVideosFromYouTubeChannelTool()
-add_video_to_vector_db_tool = AddVideoToVectorDBTool(app=app_instance)
-fire_crawl_search_tool = FirecrawlSearchTool()
-rag_tool = QueryVectorDBTool(app=app_instance)
+@lru_cache(maxsize=None)
+def fetch_relevant_videos_tool() -> FetchRelevantVideosFromYouTubeChannelTool:
+	return FetchRelevantVideosFromYouTubeChannelTool()
+
+@lru_cache(maxsize=None)
+def add_video_to_vector_db_tool(creator_id: str) -> AddVideoToVectorDBTool:
+	return AddVideoToVectorDBTool(app=app_for_creator(creator_id))
+
+@lru_cache(maxsize=None)
+def fire_crawl_search_tool():
+	from crewai_tools import FirecrawlSearchTool
+	return FirecrawlSearchTool()
+
+@lru_cache(maxsize=None)
+def rag_tool(creator_id: str) -> QueryVectorDBTool:
+	return QueryVectorDBTool(app=app_for_creator(creator_id))
 
 # First set the Instagram credentials (do this once at the start)
 # set_instagram_credentials("vladzieg", "Lommel1996+")
@@ -268,60 +285,80 @@ rag_tool = QueryVectorDBTool(app=app_instance)
 # fetch_instagram_posts_tool = FetchInstagramPostsTool()
 # add_posts_to_vectordb_tool = AddInstagramAudioTool(app=app_instance)
 # query_instagram_db_tool = QueryDatabaseTool(app=app_instance)
-prompting_rag_tool = PromptingRagTool()
-fetch_to_add_instagram_audio_tool = FetchToAddInstagramAudioTool(app=app_instance)
-query_instagram_db_tool = QueryInstagramDBTool(app=app_instance)
+@lru_cache(maxsize=None)
+def prompting_rag_tool() -> PromptingRagTool:
+	return PromptingRagTool()
+
+@lru_cache(maxsize=None)
+def fetch_to_add_instagram_audio_tool(creator_id: str) -> FetchToAddInstagramAudioTool:
+	return FetchToAddInstagramAudioTool(app=app_for_creator(creator_id))
+
+@lru_cache(maxsize=None)
+def query_instagram_db_tool(creator_id: str) -> QueryInstagramDBTool:
+	return QueryInstagramDBTool(app=app_for_creator(creator_id))
+
+def chat_llm() -> ChatOpenAI:
+	return ChatOpenAI(model="gpt-4o-mini", api_key=get_secret("OPENAI_API_KEY"))
+
+def task_label(task: Task) -> str:
+	"""Name a task in the run report: its method name, or the start of its description."""
+	return getattr(task, "name", None) or task.description.strip().splitlines()[0][:60]
+
 @CrewBase
 class LatestAiDevelopmentCrew():
 	"""LatestAiDevelopment crew"""
 
+	def __init__(self, creator_id: str = DEFAULT_CREATOR_ID):
+		# Creator whose collection the crew's vector DB tools read and write
+		self.creator_id = creator_id
+
 	@agent
 	def scrape_agent(self) -> Agent:
 		return Agent(
 			config=self.agents_config['scrape_agent'],
-			tools=[fetch_relevant_videos_tool], # Example of custom tool, loaded on the beginning of file
+			tools=[fetch_relevant_videos_tool()], # Example of custom tool, loaded on the beginning of file
 			verbose=True,
 			allow_delegation=False,
-			llm=ChatOpenAI(model="gpt-4o-mini")
+			llm=chat_llm()
 		)
 	@agent
 	def vector_db_agent(self) -> Agent:
 		return Agent(
 			config=self.agents_config['vector_db_agent'],
-			tools=[add_video_to_vector_db_tool],
+			tools=[add_video_to_vector_db_tool(self.creator_id)],
 			verbose=True,
 			allow_delegation=False,
-			llm=ChatOpenAI(model="gpt-4o-mini")
+			llm=chat_llm()
 		)
 	
 	@agent
 	def general_research_agent(self) -> Agent:
 		return Agent(
 			config=self.agents_config['general_research_agent'],
-			tools=[rag_tool, query_instagram_db_tool],
+			tools=[rag_tool(self.creator_id), query_instagram_db_tool(self.creator_id)],
 			verbose=True,
 			allow_delegation=False,
-			llm=ChatOpenAI(model="gpt-4o-mini")
+			llm=chat_llm()
 		)
 	
 	@agent
 	def follow_up_agent(self) -> Agent:
 		return Agent(
 			config=self.agents_config['follow_up_agent'],
-			tools=[rag_tool, query_instagram_db_tool],
+			tools=[rag_tool(self.creator_id), query_instagram_db_tool(self.creator_id)],
 			verbose=True,
 			allow_delegation=False,
-			llm=ChatOpenAI(model="gpt-4o-mini")
+			llm=chat_llm()
 		)
 	
 	@agent
 	def fallback_agent(self) -> Agent:
 		return Agent(
 			config=self.agents_config['fallback_agent'],
-			tools=[rag_tool],
+			tools=[rag_tool(self.creator_id)],
 			verbose=True,
 			allow_delegation=False,
-			llm=ChatOpenAI(model="gpt-4o-mini")
+			llm=chat_llm()
 		)
 	
 	# @agent
@@ -349,20 +386,20 @@ class LatestAiDevelopmentCrew():
 	def fetch_to_add_instagram_audio_agent(self) -> Agent:
 		return Agent(
 			config=self.agents_config['fetch_to_add_instagram_audio_agent'],
-			tools=[fetch_to_add_instagram_audio_tool],
+			tools=[fetch_to_add_instagram_audio_tool(self.creator_id)],
 			verbose=True,
 			allow_delegation=False,
-			llm=ChatOpenAI(model="gpt-4o-mini")
+			llm=chat_llm()
 		)
 
 	@agent
 	def prompting_rag_agent(self) -> Agent:
 		return Agent(
 			config=self.agents_config['prompting_rag_agent'],
-			tools=[prompting_rag_tool],
+			tools=[prompting_rag_tool()],
 			verbose=True,
 			allow_delegation=False,
-			llm=ChatOpenAI(model="gpt-4o-mini")
+			llm=chat_llm()
 		)
 	
 	# @task
@@ -383,14 +420,14 @@ class LatestAiDevelopmentCrew():
 	def fetch_and_add_instagram_audio_task(self) -> Task:
 		return Task(
 			config=self.tasks_config['fetch_and_add_instagram_audio_task'],
-			tools=[fetch_to_add_instagram_audio_tool],
+			tools=[fetch_to_add_instagram_audio_tool(self.creator_id)],
 		)
 	
 	@task
 	def find_instagram_information_task(self) -> Task:
 		return Task(
 			config=self.tasks_config['find_instagram_information_task'],
-			tools=[query_instagram_db_tool],
+			tools=[query_instagram_db_tool(self.creator_id)],
 			output_pydantic=ContentCreatorInfo,
 		)
 	
@@ -398,7 +435,7 @@ class LatestAiDevelopmentCrew():
 	def follow_up_instagram_task(self) -> Task:
 		return Task(
 			config=self.tasks_config['follow_up_instagram_task'],
-			tools=[query_instagram_db_tool],
+			tools=[query_instagram_db_tool(self.creator_id)],
 			output_pydantic=ContentCreatorInfo,
 		)
 
@@ -406,7 +443,7 @@ class LatestAiDevelopmentCrew():
 	def scrape_youtube_channel_task(self) -> Task:
 		return Task(
 			config=self.tasks_config['scrape_youtube_channel_task'],
-			tools=[fetch_relevant_videos_tool],
+			tools=[fetch_relevant_videos_tool()],
 			# context="Use the FetchLatestVideosFromYouTubeChannelTool to fetch the latest videos from the YouTube channel.",
 		)
 	
@@ -414,7 +451,7 @@ class LatestAiDevelopmentCrew():
 	def process_video_task(self) -> Task:
 		return Task(
 			config=self.tasks_config['process_video_task'],
-			tools=[add_video_to_vector_db_tool],
+			tools=[add_video_to_vector_db_tool(self.creator_id)],
 			# context="Use the AddVideoToVectorDBTool to add the video to the vector database."
 		)
 
@@ -424,7 +461,7 @@ class LatestAiDevelopmentCrew():
 			config=self.tasks_config['find_initial_information_task'],
 			# context="Use the RagTool to find information about the content creator.",
 			output_pydantic=ContentCreatorInfo,
-			tools=[rag_tool]
+			tools=[rag_tool(self.creator_id)]
 		)
 	
 	@task
@@ -433,7 +470,7 @@ class LatestAiDevelopmentCrew():
 			config=self.tasks_config['follow_up_task'],
 			output_pydantic=ContentCreatorInfo,
             # context="Use the RagTool to find information about the content creator.",
-			tools=[rag_tool]
+			tools=[rag_tool(self.creator_id)]
 		)
 	
 	@task
@@ -441,14 +478,14 @@ class LatestAiDevelopmentCrew():
 		return Task(
 			config=self.tasks_config['fallback_task'],
 			output_pydantic=ContentCreatorInfo,
-			tools=[rag_tool,query_instagram_db_tool],
+			tools=[rag_tool(self.creator_id),query_instagram_db_tool(self.creator_id)],
 		)
 
 	@task
 	def prompting_rag_task(self) -> Task:
 		return Task(
 			config=self.tasks_config['prompting_rag_task'],
-			tools=[prompting_rag_tool],
+			tools=[prompting_rag_tool()],
 			# context={"content_creator_info": "fallback_task.output"},  # Changed this line
 			# context=["fallback_task.output_pydantic"],
 			output_file="prompting_rag_task_output.txt"
@@ -457,11 +494,14 @@ class LatestAiDevelopmentCrew():
 	@crew
 	def crew(self) -> Crew:
 		"""Creates the LatestAiDevelopment crew"""
+		# Tool and LLM calls are accounted to the task running them (see tools/instrumentation.py)
+		run = start_run([task_label(task) for task in self.tasks])
 		return Crew(
 			agents=self.agents, # Automatically created by the @agent decorator
 			tasks=self.tasks, # Automatically created by the @task decorator
 			process=Process.sequential,
 			verbose=True,
-			full_output=True
+			full_output=True,
+			task_callback=run.task_completed
 			# process=Process.hierarchical, # In case you wanna use that instead https://docs.crewai.com/how-to/Hierarchical/
 		)
\ No newline at end of file
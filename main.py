@@ -1,7 +1,14 @@
 #!/usr/bin/env python
+import os
+import subprocess
 import sys
 import json
 from smartfunnel.crew import LatestAiDevelopmentCrew
+from smartfunnel.tools.chroma_db_init import creator_id_from_handle
+from smartfunnel.tools.instrumentation import format_run_report, run_report, write_run_report
+
+# Importing the crew must not build the embedchain app, clients or tools
+STARTUP_BUDGET_SECONDS = float(os.getenv("SMARTFUNNEL_STARTUP_BUDGET", "5"))
 
 def save_output_to_markdown(crew_output, filename="creatorOutput.md"):
     """
@@ -19,7 +26,8 @@ def save_output_to_markdown(crew_output, filename="creatorOutput.md"):
                 md_file.write(f"## Pydantic Output\n\n```\n{crew_output.pydantic}\n```\n\n")
             
             md_file.write(f"## Tasks Output\n\n```\n{crew_output.tasks_output}\n```\n\n")
-            md_file.write(f"## Token Usage\n\n```\n{crew_output.token_usage}\n```\n")
+            md_file.write(f"## Token Usage\n\n```\n{crew_output.token_usage}\n```\n\n")
+            md_file.write(f"## Calls by Task\n\n```\n{format_run_report(run_report())}\n```\n")
             
         return True
     except Exception as e:
@@ -31,6 +39,13 @@ def print_output(crew_output):
     print(f"Pydantic Output: {crew_output.pydantic}")
     print(f"Tasks Output: {crew_output.tasks_output}")
     print(f"Token Usage: {crew_output.token_usage}")
+    from smartfunnel.tools.answer_cache import get_answer_cache
+    from smartfunnel.tools.context_assembly import context_stats
+    from smartfunnel.tools.embedding_cache import get_embedding_cache
+    print(f"Embedding Cache: {get_embedding_cache().stats()}")
+    print(f"Answer Cache: {get_answer_cache().stats()}")
+    print(f"Context Assembly: {context_stats()}")
+    print(f"Calls by Task:\n{format_run_report(run_report())}")
 
 def run():
     """
@@ -46,18 +61,44 @@ def run():
             "instagram_username": instagram_username  # Remove the set creation
         }
         
+        # The crew reads and writes the persistent collection of this creator only
+        creator_id = creator_id_from_handle(youtube_channel_handle or instagram_username)
+
         # Run the crew
-        crew_output = LatestAiDevelopmentCrew().crew().kickoff(inputs=inputs)
+        crew_output = LatestAiDevelopmentCrew(creator_id).crew().kickoff(inputs=inputs)
         
         # Save and print output
         if save_output_to_markdown(crew_output):
             print("\nOutput has been saved to creatorOutput.md")
+        print(f"Run report saved to {write_run_report()}")
         print_output(crew_output)
         
     except Exception as e:
         print(f"An error occurred: {str(e)}")
         sys.exit(1)
 
+def check_startup():
+    """
+    Time a cold import of the crew in a fresh interpreter and exit non-zero
+    if it takes longer than SMARTFUNNEL_STARTUP_BUDGET seconds.
+    """
+    code = (
+        "import time; started = time.perf_counter(); "
+        "import smartfunnel.crew; "
+        "print(time.perf_counter() - started)"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+    if result.returncode != 0:
+        print(f"Importing smartfunnel.crew failed:\n{result.stderr}")
+        sys.exit(1)
+    seconds = float(result.stdout.strip().splitlines()[-1])
+    print(f"Startup: {seconds:.2f}s (budget {STARTUP_BUDGET_SECONDS:.2f}s)")
+    if seconds > STARTUP_BUDGET_SECONDS:
+        sys.exit(1)
+
 if __name__ == "__main__":
-    run()
+    if sys.argv[1:] == ["check_startup"]:
+        check_startup()
+    else:
+        run()
 
@@ -0,0 +1,108 @@
+import math
+
+import pytest
+
+from smartfunnel.tools import retrieval
+from smartfunnel.tools.lexical_index import LexicalIndex
+
+
+def _matches(metadata, where):
+    if not where:
+        return True
+    if "$and" in where:
+        return all(_matches(metadata, clause) for clause in where["$and"])
+    for key, value in where.items():
+        if isinstance(value, dict) and "$in" in value:
+            if metadata.get(key) not in value["$in"]:
+                return False
+        elif metadata.get(key) != value:
+            return False
+    return True
+
+
+class FakeCollection:
+    """The parts of a Chroma collection search_many uses, with exact l2 search."""
+
+    name = "fake"
+    metadata = {"hnsw:space": "l2"}
+
+    def __init__(self, rows):
+        self.rows = rows  # chunk id -> (text, metadata, embedding)
+
+    def count(self):
+        return len(self.rows)
+
+    def query(self, query_embeddings, n_results, where=None, include=()):
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": [], "embeddings": []}
+        for query in query_embeddings:
+            hits = sorted(
+                (math.dist(query, embedding) ** 2, chunk_id)
+                for chunk_id, (_, metadata, embedding) in self.rows.items()
+                if _matches(metadata, where)
+            )[:n_results]
+            result["ids"].append([chunk_id for _, chunk_id in hits])
+            result["documents"].append([self.rows[chunk_id][0] for _, chunk_id in hits])
+            result["metadatas"].append([self.rows[chunk_id][1] for _, chunk_id in hits])
+            result["distances"].append([distance for distance, _ in hits])
+            result["embeddings"].append([self.rows[chunk_id][2] for _, chunk_id in hits])
+        return result
+
+    def get(self, ids=None, where=None, include=()):
+        selected = [
+            chunk_id for chunk_id in (self.rows if ids is None else ids)
+            if chunk_id in self.rows and _matches(self.rows[chunk_id][1], where)
+        ]
+        return {
+            "ids": selected,
+            "documents": [self.rows[chunk_id][0] for chunk_id in selected],
+            "metadatas": [self.rows[chunk_id][1] for chunk_id in selected],
+            "embeddings": [self.rows[chunk_id][2] for chunk_id in selected],
+        }
+
+
+class FakeApp:
+    def __init__(self, rows):
+        self.db = type("Db", (), {"collection": FakeCollection(rows)})()
+
+
+@pytest.fixture
+def lexical_index(tmp_path, monkeypatch):
+    index = LexicalIndex(tmp_path / "lexical_index.sqlite3")
+    monkeypatch.setattr(retrieval, "get_lexical_index", lambda: index)
+    return index
+
+
+def _rows():
+    rows = {
+        f"x{i}": (f"souvenirs de voyage numero {i}", {"source": f"s{i}"}, [1.0, 0.01 * i])
+        for i in range(20)
+    }
+    rows.update({
+        f"y{i}": (f"chiffre d'affaires numero {i}", {"source": f"t{i}"}, [0.01 * i, 1.0])
+        for i in range(4)
+    })
+    # Only a keyword hit for "desirade", but a vector hit for the business query
+    rows["d"] = ("enfance a la Desirade", {"source": "d"}, [0.0, 1.0])
+    return rows
+
+
+def test_batched_search_ranks_each_query_as_alone(lexical_index):
+    app = FakeApp(_rows())
+    alone = retrieval.search_many(app, ["desirade"], [[1.0, 0.0]], k=2)["desirade"]
+    batched = retrieval.search_many(app, ["desirade", "business"], [[1.0, 0.0], [0.0, 1.0]], k=2)["desirade"]
+
+    assert "d" in [chunk.source for chunk in alone]
+    assert [chunk.source for chunk in batched] == [chunk.source for chunk in alone]
+
+
+def test_keyword_hits_are_taken_from_the_searched_partition(lexical_index):
+    rows = {
+        f"yt{i}": (f"La Desirade episode {i}", {"source": f"yt{i}", "source_type": "youtube"}, [1.0, 0.0])
+        for i in range(30)
+    }
+    rows["ig"] = ("La Desirade, une ile au large de la Guadeloupe, ou j ai grandi", {"source": "ig", "source_type": "instagram_caption"}, [0.0, 1.0])
+    app = FakeApp(rows)
+
+    chunks = retrieval.keyword_search(app, "desirade", k=1, where={"source_type": "instagram_caption"})
+
+    assert [chunk.source for chunk in chunks] == ["ig"]
@@ -1,32 +1,65 @@
 from crewai_tools.tools.base_tool import BaseTool
 from pydantic.v1 import BaseModel, Field
-from typing import Any, Type
-from embedchain import App
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple, Type
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio
 from youtube_transcript_api import YouTubeTranscriptApi
 import logging
 import re
-from bs4 import BeautifulSoup
+import time
 import re
-import requests
+from smartfunnel.tools import instrumentation
+from smartfunnel.tools.bulk_ingest import abulk_add, bulk_add
+from smartfunnel.tools.partitions import SOURCE_TYPE_YOUTUBE, partition_metadata
+from smartfunnel.tools.source_registry import source_registry
+from smartfunnel.tools.transcript_cache import get_transcript_cache
+
+if TYPE_CHECKING:
+    from embedchain import App
 
 logger = logging.getLogger(__name__)
 
 logger = logging.getLogger(__name__)
 
+# The analyzed creators mostly publish in French
+DEFAULT_TRANSCRIPT_LANGUAGES = ["fr-FR", "fr", "en-US", "en"]
+
 class AddVideoToVectorDBInput(BaseModel):
-    video_url: str = Field(..., description="The URL of the YouTube video to add to the vector DB.")
+    video_url: str = Field(default="", description="The URL of the YouTube video to add to the vector DB.")
+    video_urls: List[str] = Field(default_factory=list, description="Several YouTube video URLs to add to the vector DB in parallel.")
+
+class VideoIngestResult(BaseModel):
+    video_url: str = Field(..., description="The URL of the video.")
+    success: bool = Field(..., description="Whether the video is in the vector DB after this call.")
+    skipped: bool = Field(default=False, description="Whether the video was already in the vector DB.")
+    error_message: str = Field(default="", description="Error message if the video failed.")
+    transcript_track: str = Field(default="", description="Language of the transcript track used, suffixed with -auto for auto-generated captions.")
+    fetch_seconds: float = Field(default=0.0, description="Time spent fetching the transcript.")
+    embed_seconds: float = Field(default=0.0, description="Time spent embedding and storing the batch of transcripts the video was added with.")
+    total_seconds: float = Field(default=0.0, description="Total time spent on the video.")
 
 class AddVideoToVectorDBOutput(BaseModel):
     success: bool = Field(..., description="Whether the video was successfully added to the vector DB.")
     error_message: str = Field(default="", description="Error message if the operation failed.")
+    skipped_sources: List[str] = Field(default_factory=list, description="Videos skipped because they are already in the vector DB.")
+    results: List[VideoIngestResult] = Field(default_factory=list, description="Per-video results with timings.")
 
 class AddVideoToVectorDBTool(BaseTool):
     name: str = "Add Video to Vector DB"
-    description: str = "Adds a YouTube video transcript to the vector database."
+    description: str = (
+        "Adds YouTube video transcripts to the vector database. "
+        "Pass all the video URLs at once in video_urls to ingest them in parallel."
+    )
     args_schema: Type[AddVideoToVectorDBInput] = AddVideoToVectorDBInput
     app: Any = Field(default=None, exclude=True)
+    max_workers: int = Field(default=5, description="Maximum number of transcripts fetched concurrently.")
+    ingest_batch_size: int = Field(default=10, description="Transcripts embedded and written to the vector DB together.")
+    transcript_languages: List[str] = Field(
+        default_factory=lambda: list(DEFAULT_TRANSCRIPT_LANGUAGES),
+        description="Transcript languages in order of preference."
+    )
 
-    def __init__(self, app: App, **data):
+    def __init__(self, app: "App", **data):
         super().__init__(**data)
         self.app = app
 
@@ -38,56 +71,215 @@ class AddVideoToVectorDBTool(BaseTool):
         else:
             raise ValueError("Could not extract video ID from URL")
 
-    def _fetch_transcript(self, video_id: str) -> str:
-        """Fetch the transcript for a given YouTube video ID."""
-        try:
-            # First, try to get the official transcript
-            transcript = YouTubeTranscriptApi.get_transcript(video_id)
-            return " ".join([entry['text'] for entry in transcript])
-        except Exception as e:
-            logger.warning(f"Failed to fetch official transcript: {str(e)}")
-            
-            # If official transcript fails, try to get auto-generated captions
-            try:
-                print("Trying to fetch auto-generated captions")
-                # transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['en-US', 'en'])
-                transcript = YouTubeTranscriptApi.get_transcript(video_id, languages=['fr-FR', 'fr'])
-                return " ".join([entry['text'] for entry in transcript])
-            except Exception as e:
-                logger.warning(f"Failed to fetch auto-generated captions: {str(e)}")
-                
-                # If both methods fail, try to scrape the transcript
-                print("Trying to scrape captions")
-                return self._scrape_transcript(video_id)
-
-    def _scrape_transcript(self, video_id: str) -> str:
-        """Scrape the transcript from the YouTube video page."""
-        url = f"https://www.youtube.com/watch?v={video_id}"
-        response = requests.get(url)
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # Look for the transcript in the page source
-        transcript_element = soup.find('div', {'class': 'ytd-transcript-renderer'})
-        if transcript_element:
-            return transcript_element.get_text()
+    def _fetch_transcript(self, video_id: str) -> Tuple[str, str]:
+        """
+        Fetch the transcript for a given YouTube video ID, using the on-disk
+        cache first. Returns (track, text), e.g. ("fr-auto", "...").
+        """
+        cache = get_transcript_cache()
+        cached = cache.get(video_id)
+        if cached:
+            track, transcript = cached
+            logger.info(f"Using cached transcript ({track}) for video ID: {video_id}")
         else:
-            raise Exception("Could not find transcript in the video page")
+            with instrumentation.track("http", "youtube.transcript") as call:
+                track, transcript = self._resolve_transcript(video_id)
+                call.bytes = sum(len(entry['text'].encode("utf-8")) for entry in transcript)
+            cache.put(video_id, track, transcript)
+        # One caption per line so the chunker can split on caption boundaries
+        return track, "\n".join([entry['text'] for entry in transcript])
+
+    def _list_transcripts(self, video_id: str):
+        """The caption tracks of a video; youtube_transcript_api 1.x lists them from an instance."""
+        api = YouTubeTranscriptApi()
+        if hasattr(api, "list"):
+            return api.list(video_id)
+        return YouTubeTranscriptApi.list_transcripts(video_id)
+
+    def _transcript_entries(self, fetched) -> List[Dict]:
+        """
+        Caption dicts ({"text", "start", "duration"}) of a fetched track:
+        youtube_transcript_api 1.x returns a FetchedTranscript of snippet
+        objects, earlier versions a list of dicts.
+        """
+        if hasattr(fetched, "to_raw_data"):
+            return fetched.to_raw_data()
+        return [
+            entry if isinstance(entry, dict) else {"text": entry.text, "start": entry.start, "duration": entry.duration}
+            for entry in fetched
+        ]
 
-    def _run(self, video_url: str) -> AddVideoToVectorDBOutput:
+    def _resolve_transcript(self, video_id: str) -> Tuple[str, List[Dict]]:
+        """List the available caption tracks once and fetch the best one."""
+        transcripts = list(self._list_transcripts(video_id))
+        if not transcripts:
+            raise ValueError(f"No transcript available for video ID: {video_id}")
+        transcript = min(
+            transcripts,
+            key=lambda t: (self._language_rank(t.language_code), t.is_generated)
+        )
+        track = transcript.language_code + ("-auto" if transcript.is_generated else "")
+        logger.info(f"Selected transcript track {track} for video ID: {video_id}")
+        return track, self._transcript_entries(transcript.fetch())
+
+    def _language_rank(self, language_code: str) -> int:
+        """Rank a track language by the preference list; exact matches beat base-language matches."""
+        for i, preferred in enumerate(self.transcript_languages):
+            if language_code == preferred:
+                return 2 * i
+            if language_code.split("-")[0] == preferred.split("-")[0]:
+                return 2 * i + 1
+        return 2 * len(self.transcript_languages)
+
+    def _canonical_url(self, video_id: str) -> str:
+        """Return the canonical watch URL used as the "source" of a video."""
+        return f"https://www.youtube.com/watch?v={video_id}"
+
+    def _is_indexed(self, video_url: str, source: str) -> bool:
+        """Whether the video is in the vector DB, under its canonical or its given URL."""
+        return source_registry.contains(self.app, source) or source_registry.contains(self.app, video_url)
+
+    def _fetch_video(self, video_url: str) -> Tuple[VideoIngestResult, Optional[Tuple[str, Dict[str, Any]]]]:
+        """
+        Check the registry and fetch the transcript of a video. Returns its
+        result so far and the (text, metadata) document to ingest, which is
+        None if the video was skipped or failed.
+        """
+        started = time.perf_counter()
         try:
             logger.info(f"Processing video: {video_url}")
             video_id = self._extract_video_id(video_url)
-            transcript_text = self._fetch_transcript(video_id)
-            
-            logger.info(f"Adding transcript to vector DB for video ID: {video_id}")
-            self.app.add(transcript_text, data_type="text", metadata={"source": video_url})
-            logger.info("Transcript successfully added to vector DB")
-            
-            return AddVideoToVectorDBOutput(success=True)
+            source = self._canonical_url(video_id)
+            if self._is_indexed(video_url, source):
+                logger.info(f"Video already in vector DB, skipping: {source}")
+                return VideoIngestResult(
+                    video_url=source,
+                    success=True,
+                    skipped=True,
+                    total_seconds=time.perf_counter() - started
+                ), None
+
+            track, transcript_text = self._fetch_transcript(video_id)
+            fetch_seconds = time.perf_counter() - started
+            result = VideoIngestResult(
+                video_url=source,
+                success=True,
+                transcript_track=track,
+                fetch_seconds=fetch_seconds,
+                total_seconds=fetch_seconds
+            )
+            return result, (transcript_text, partition_metadata(self.app, source, SOURCE_TYPE_YOUTUBE))
         except Exception as e:
             error_message = f"Failed to add video transcript: {str(e)}"
             logger.error(error_message)
-            return AddVideoToVectorDBOutput(success=False, error_message=error_message)
+            return VideoIngestResult(
+                video_url=video_url,
+                success=False,
+                error_message=error_message,
+                total_seconds=time.perf_counter() - started
+            ), None
+
+    def _stored(
+        self, fetched: List[Tuple[VideoIngestResult, Any]], embed_started: float, error: Optional[Exception] = None
+    ) -> List[VideoIngestResult]:
+        """Complete the results of a batch of fetched videos once their transcripts were stored (or failed to be)."""
+        embed_seconds = time.perf_counter() - embed_started
+        results = []
+        for result, _ in fetched:
+            result.embed_seconds = embed_seconds
+            result.total_seconds = result.fetch_seconds + embed_seconds
+            if error is not None:
+                result.success = False
+                result.error_message = f"Failed to add video transcript: {str(error)}"
+            results.append(result)
+        if error is not None:
+            logger.error(f"Failed to add {len(fetched)} video transcripts: {str(error)}")
+        else:
+            logger.info(f"{len(fetched)} transcripts successfully added to vector DB")
+        return results
+
+
+    def _ingest_batch(self, batch: List[Tuple[VideoIngestResult, Any]]) -> List[VideoIngestResult]:
+        """Embed and store a batch of transcripts together; bulk_add registers them once written."""
+        embed_started = time.perf_counter()
+        try:
+            bulk_add(self.app, [document for _, document in batch])
+        except Exception as e:
+            return self._stored(batch, embed_started, e)
+        return self._stored(batch, embed_started)
+
+    async def _aingest_batch(self, batch: List[Tuple[VideoIngestResult, Any]]) -> List[VideoIngestResult]:
+        """Async _ingest_batch: embeddings go through the async OpenAI client."""
+        embed_started = time.perf_counter()
+        try:
+            await abulk_add(self.app, [document for _, document in batch])
+        except Exception as e:
+            return self._stored(batch, embed_started, e)
+        return self._stored(batch, embed_started)
+
+    def _video_urls(self, video_url: str, video_urls: Optional[List[str]]) -> List[str]:
+        return list(dict.fromkeys(([video_url] if video_url else []) + list(video_urls or [])))
+
+    def _output(self, results: List[VideoIngestResult]) -> AddVideoToVectorDBOutput:
+        errors = [result.error_message for result in results if not result.success]
+        return AddVideoToVectorDBOutput(
+            success=not errors,
+            error_message="; ".join(errors),
+            skipped_sources=[result.video_url for result in results if result.skipped],
+            results=results
+        )
+
+    def _run(self, video_url: str = "", video_urls: Optional[List[str]] = None) -> AddVideoToVectorDBOutput:
+        urls = self._video_urls(video_url, video_urls)
+        if not urls:
+            return AddVideoToVectorDBOutput(success=False, error_message="No video URL provided.")
+
+        # Transcripts are fetched concurrently and embedded and written in batches
+        # of ingest_batch_size as they arrive, so a batch is embedded while the
+        # pool keeps fetching the next videos, and embedding requests and upserts
+        # are shared across the videos of a batch.
+        results: Dict[str, VideoIngestResult] = {}
+        batch: List[Tuple[VideoIngestResult, Any]] = []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            futures = {executor.submit(instrumentation.bind_run(self._fetch_video), url): url for url in urls}
+            for future in as_completed(futures):
+                result, document = future.result()
+                results[futures[future]] = result
+                if document is not None:
+                    batch.append((result, document))
+                if len(batch) >= max(1, self.ingest_batch_size):
+                    self._ingest_batch(batch)
+                    batch = []
+        if batch:
+            self._ingest_batch(batch)
+        return self._output([results[url] for url in urls])
+
+    async def _arun(self, video_url: str = "", video_urls: Optional[List[str]] = None) -> AddVideoToVectorDBOutput:
+        urls = self._video_urls(video_url, video_urls)
+        if not urls:
+            return AddVideoToVectorDBOutput(success=False, error_message="No video URL provided.")
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def fetch(url: str):
+            async with semaphore:
+                # The registry scan and youtube_transcript_api are synchronous, so they run in a worker thread
+                return url, await asyncio.to_thread(self._fetch_video, url)
+
+        # Batches are ingested as their transcripts arrive, while the other fetches go on
+        results: Dict[str, VideoIngestResult] = {}
+        batch: List[Tuple[VideoIngestResult, Any]] = []
+        for next_fetched in asyncio.as_completed([fetch(url) for url in urls]):
+            url, (result, document) = await next_fetched
+            results[url] = result
+            if document is not None:
+                batch.append((result, document))
+            if len(batch) >= max(1, self.ingest_batch_size):
+                await self._aingest_batch(batch)
+                batch = []
+        if batch:
+            await self._aingest_batch(batch)
+        return self._output([results[url] for url in urls])
         
 # class AddVideoToVectorDBInput(BaseModel):
 #     video_url: str = Field(..., description="The URL of the YouTube video to add to the vector DB.")
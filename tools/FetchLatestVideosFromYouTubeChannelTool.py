@@ -5,6 +5,8 @@ from typing import List, Type
 import requests
 from crewai_tools.tools.base_tool import BaseTool
 from pydantic.v1 import BaseModel, Field
+from smartfunnel.tools.instrumentation import track
+from smartfunnel.tools.youtube_api import resolve_channel_id
 
 
 class FetchLatestVideosFromYouTubeChannelInput(BaseModel):
@@ -42,20 +44,7 @@ class FetchLatestVideosFromYouTubeChannelTool(BaseTool):
     ) -> FetchLatestVideosFromYouTubeChannelOutput:
         api_key = os.getenv("YOUTUBE_API_KEY")
 
-        url = "https://www.googleapis.com/youtube/v3/search"
-        params = {
-            "part": "snippet",
-            "type": "channel",
-            "q": youtube_channel_handle,
-            "key": api_key,
-        }
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        items = response.json().get("items", [])
-        if not items:
-            raise ValueError(f"No channel found for handle {youtube_channel_handle}")
-
-        channel_id = items[0]["id"]["channelId"]
+        channel_id = resolve_channel_id(youtube_channel_handle, api_key)
 
         url = "https://www.googleapis.com/youtube/v3/search"
         params = {
@@ -66,7 +55,9 @@ class FetchLatestVideosFromYouTubeChannelTool(BaseTool):
             "type": "video",
             "key": api_key,
         }
-        response = requests.get(url, params=params)
+        with track("http", "youtube.search") as call:
+            response = requests.get(url, params=params)
+            call.bytes = len(response.content)
         response.raise_for_status()
         items = response.json().get("items", [])
 
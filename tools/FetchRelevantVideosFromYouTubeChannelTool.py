@@ -6,13 +6,16 @@ from typing import List, Type
 import requests
 from crewai_tools.tools.base_tool import BaseTool
 from pydantic.v1 import BaseModel, Field
-from groq import Groq
-import openai
-import time
-import streamlit as st
-
-YOUTUBE_API_KEY = st.secrets["YOUTUBE_API_KEY"]
-GROQ_API_KEY = st.secrets["GROQ_API_KEY"]
+from smartfunnel.tools.instrumentation import add_usage, track
+from smartfunnel.tools.settings import get_secret
+from smartfunnel.tools.video_ranking import DEFAULT_SHORTLIST, prerank_videos, score_videos
+from smartfunnel.tools.youtube_api import (
+    parse_duration,
+    resolve_channel_id,
+    uploads_playlist_id,
+    youtube_get,
+    youtube_get_many,
+)
 
 class FetchRelevantVideosFromYouTubeChannelInput(BaseModel):
     """Input for FetchRelevantVideosFromYouTubeChannel."""
@@ -29,6 +32,9 @@ class VideoInfo(BaseModel):
     category_id: str
     view_count: int
     like_count: int
+    comment_count: int = 0
+    duration_seconds: int = 0
+    prerank_score: float = 0.0
     relevance_score: float = 0.0
 
 class FetchRelevantVideosFromYouTubeChannelOutput(BaseModel):
@@ -43,12 +49,18 @@ class FetchRelevantVideosFromYouTubeChannelTool(BaseTool):
     )
     args_schema: Type[BaseModel] = FetchRelevantVideosFromYouTubeChannelInput
     return_schema: Type[BaseModel] = FetchRelevantVideosFromYouTubeChannelOutput
+    batched_ranking: bool = Field(
+        default=True, description="Rate the videos in batched completions instead of one completion per video."
+    )
+    shortlist_size: int = Field(
+        default=DEFAULT_SHORTLIST, description="Videos kept by the local pre-ranker for LLM rating."
+    )
 
     def _run(
         self,
         youtube_channel_handle: str,
     ) -> FetchRelevantVideosFromYouTubeChannelOutput:
-        api_key = YOUTUBE_API_KEY
+        api_key = get_secret("YOUTUBE_API_KEY")
         # api_key = os.getenv("YOUTUBE_API_KEY")
         if not api_key:
             raise ValueError("YOUTUBE_API_KEY environment variable is not set")
@@ -61,6 +73,7 @@ class FetchRelevantVideosFromYouTubeChannelTool(BaseTool):
         for video_id, details in video_details.items():
             snippet = details.get("snippet", {})
             statistics = details.get("statistics", {})
+            content_details = details.get("contentDetails", {})
 
             if self.is_short_video(snippet):
                 continue
@@ -76,36 +89,25 @@ class FetchRelevantVideosFromYouTubeChannelTool(BaseTool):
                     video_url=f"https://www.youtube.com/watch?v={video_id}",
                     category_id=snippet.get("categoryId", ""),
                     view_count=int(statistics.get("viewCount", 0)),
-                    like_count=int(statistics.get("likeCount", 0))
+                    like_count=int(statistics.get("likeCount", 0)),
+                    comment_count=int(statistics.get("commentCount", 0)),
+                    duration_seconds=parse_duration(content_details.get("duration", "")),
                 )
             )
 
-        # Sort by popularity (view count) and take top 50
-        popular_videos = sorted(videos, key=lambda v: v.view_count, reverse=True)[:50]
+        # Score every video locally and only send the shortlist to the LLM
+        shortlist = prerank_videos(videos, self.shortlist_size)
 
-        ranked_videos = self.rank_videos(popular_videos)
+        ranked_videos = self.rank_videos(shortlist)
         # return FetchRelevantVideosFromYouTubeChannelOutput(videos=ranked_videos[:10])
         return FetchRelevantVideosFromYouTubeChannelOutput(videos=ranked_videos[:10])
 
 
     def get_channel_id(self, youtube_channel_handle: str, api_key: str) -> str:
-        url = "https://www.googleapis.com/youtube/v3/search"
-        params = {
-            "part": "snippet",
-            "type": "channel",
-            "q": youtube_channel_handle,
-            "key": api_key,
-        }
         try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            items = response.json().get("items", [])
-            if not items:
-                raise ValueError(f"No channel found for handle {youtube_channel_handle}")
-            return items[0]["id"]["channelId"]
+            return resolve_channel_id(youtube_channel_handle, api_key)
         except requests.exceptions.RequestException as e:
             print(f"Error in get_channel_id: {e}")
-            print(f"Response content: {response.content}")
             raise
 
     def is_short_video(self, snippet: dict) -> bool:
@@ -113,73 +115,65 @@ class FetchRelevantVideosFromYouTubeChannelTool(BaseTool):
         description = snippet.get("description", "").lower()
         return "#shorts" in title or "#shorts" in description or snippet.get("categoryId") == "22"
 
-    def fetch_all_videos(self, channel_id: str, api_key: str) -> List[str]:
-        url = "https://www.googleapis.com/youtube/v3/search"
+    def fetch_all_videos(self, channel_id: str, api_key: str, max_videos: int = 200) -> List[str]:
+        """
+        Ids of the channel's latest uploads, newest first. The uploads playlist
+        is paged through playlistItems.list (1 quota unit per page of 50)
+        rather than search.list (100 units per page).
+        """
         params = {
-            "part": "id",
-            "channelId": channel_id,
+            "part": "contentDetails",
+            "playlistId": uploads_playlist_id(channel_id, api_key),
             "maxResults": 50,  # Maximum allowed per request
-            "order": "date",
-            "type": "video",
-            "key": api_key,
         }
 
         all_video_ids = []
-        page_token = None
         try:
-            while len(all_video_ids) < 200:
-                if page_token:
-                    params["pageToken"] = page_token
-
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                data = response.json()
-                
-                new_video_ids = [item["id"]["videoId"] for item in data.get("items", [])]
-                all_video_ids.extend(new_video_ids)
+            while len(all_video_ids) < max_videos:
+                data = youtube_get("playlistItems", params, api_key)
+                all_video_ids.extend(item["contentDetails"]["videoId"] for item in data.get("items", []))
 
                 page_token = data.get("nextPageToken")
-                if not page_token or len(new_video_ids) == 0:
+                if not page_token or not data.get("items"):
                     break  # No more pages or no new videos
+                params["pageToken"] = page_token
 
-                # Respect YouTube API quota limits
-                time.sleep(1)  # Wait 1 second between requests
-
-            return all_video_ids[:200]  # Ensure we don't exceed 200 videos
+            return all_video_ids[:max_videos]
         except requests.exceptions.RequestException as e:
             print(f"Error in fetch_all_videos: {e}")
-            print(f"Response content: {response.content}")
             raise
 
     def fetch_video_details(self, video_ids: List[str], api_key: str, batch_size: int = 50) -> dict:
-        video_details = {}
-        url = "https://www.googleapis.com/youtube/v3/videos"
-
-        for i in range(0, len(video_ids), batch_size):
-            batch = video_ids[i:i + batch_size]
-            params = {
-                "part": "snippet,statistics",
-                "id": ",".join(batch),
-                "key": api_key,
-            }
-            try:
-                response = requests.get(url, params=params)
-                response.raise_for_status()
-                batch_details = {item["id"]: item for item in response.json()["items"]}
-                video_details.update(batch_details)
-
-                # Respect YouTube API quota limits
-                time.sleep(1)  # Wait 1 second between requests
-            except requests.exceptions.RequestException as e:
-                print(f"Error in fetch_video_details: {e}")
-                print(f"Response content: {response.content}")
-                raise
+        """Snippet and statistics of the videos, keyed by id. The batches of 50 ids are fetched concurrently."""
+        params_list = [
+            {"part": "snippet,statistics,contentDetails", "id": ",".join(video_ids[i:i + batch_size])}
+            for i in range(0, len(video_ids), batch_size)
+        ]
+        try:
+            responses = youtube_get_many("videos", params_list, api_key)
+        except requests.exceptions.RequestException as e:
+            print(f"Error in fetch_video_details: {e}")
+            raise
 
+        video_details = {}
+        for data in responses:
+            video_details.update({item["id"]: item for item in data.get("items", [])})
         return video_details
 
     def rank_videos(self, videos: List[VideoInfo]) -> List[VideoInfo]:
+        if not self.batched_ranking:
+            return self.rank_videos_individually(videos)
+
+        scores = score_videos(videos)
+        for video in videos:
+            video.relevance_score = scores.get(video.video_id, 0) * 10  # Convert to 0-100 scale
+        return sorted(videos, key=lambda v: v.relevance_score, reverse=True)
+
+    def rank_videos_individually(self, videos: List[VideoInfo]) -> List[VideoInfo]:
         # groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-        groq_client = GROQ_API_KEY
+        from groq import Groq
+
+        groq_client = Groq(api_key=get_secret("GROQ_API_KEY"))
         
         for video in videos:
             prompt = f"""
@@ -192,15 +186,17 @@ class FetchRelevantVideosFromYouTubeChannelTool(BaseTool):
             """
 
             try:
-                response = groq_client.chat.completions.create(
-                    model="llama-3.1-70b-versatile",
-                    messages=[
-                        {"role": "system", "content": "You are an AI that rates videos based on their relevance to the creator's personal story. Respond only with a number from 0 to 10."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    max_tokens=5,
-                    temperature=0.2
-                )
+                with track("llm", "llama-3.1-70b-versatile:rank_videos") as call:
+                    response = groq_client.chat.completions.create(
+                        model="llama-3.1-70b-versatile",
+                        messages=[
+                            {"role": "system", "content": "You are an AI that rates videos based on their relevance to the creator's personal story. Respond only with a number from 0 to 10."},
+                            {"role": "user", "content": prompt}
+                        ],
+                        max_tokens=5,
+                        temperature=0.2
+                    )
+                    add_usage(call, response.usage)
 
                 score_text = response.choices[0].message.content.strip()
                 try:
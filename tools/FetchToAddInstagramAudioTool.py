@@ -9,8 +9,7 @@ import os
 
 import tempfile
 import logging
-from embedchain import App
-from typing import Any, Type, List
+from typing import TYPE_CHECKING, Any, Type, List
 from datetime import datetime
 from pydantic import BaseModel, Field
 from crewai_tools.tools.base_tool import BaseTool
@@ -19,15 +18,10 @@ import os
 import requests
 import io
 from pydub import AudioSegment
-from deepgram import Deepgram
-import streamlit as st
+from smartfunnel.tools.settings import get_secret
 
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-# OPENAI_API_KEY = os.environ["OPENAI_API_KEY"]
-# Set up Deepgram
-DEEPGRAM_API_KEY = st.secrets["DEEPGRAM_API_KEY"]
-# DEEPGRAM_API_KEY = os.environ["DEEPGRAM_API_KEY"]
-# deepgram = Deepgram(DEEPGRAM_API_KEY)
+if TYPE_CHECKING:
+    from embedchain import App
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -82,7 +76,9 @@ import os
 import requests
 import io
 from pydub import AudioSegment
-from embedchain import App
+from smartfunnel.tools.source_registry import source_registry
+from smartfunnel.tools.instrumentation import track
+from smartfunnel.tools.partitions import SOURCE_TYPE_INSTAGRAM_AUDIO, partition_metadata
 
 
 logging.basicConfig(level=logging.INFO)
@@ -99,6 +95,7 @@ class FetchToAddInstagramAudioOutput(BaseModel):
     error_message: str = Field(default="", description="Error message if any operations failed")
     total_posts_found: int = Field(default=0, description="Total number of posts found")
     total_videos_processed: int = Field(default=0, description="Total number of videos processed")
+    skipped_sources: List[str] = Field(default_factory=list, description="Posts skipped because they are already in the vector database")
 
 class FetchToAddInstagramAudioTool(BaseTool):
     """Tool that fetches Instagram posts and processes their audio for the vector database."""
@@ -108,7 +105,7 @@ class FetchToAddInstagramAudioTool(BaseTool):
     insta_loader: Any = Field(default=None, exclude=True)
     app: Any = Field(default=None, exclude=True)
 
-    def __init__(self, app: App, **data):
+    def __init__(self, app: "App", **data):
         super().__init__(**data)
         self.app = app
 
@@ -117,8 +114,8 @@ class FetchToAddInstagramAudioTool(BaseTool):
         if not self.insta_loader:
             self.insta_loader = instaloader.Instaloader()
             try:
-                username = st.secrets["INSTAGRAM_USERNAME"]
-                password = st.secrets["INSTAGRAM_PASSWORD"]
+                username = get_secret("INSTAGRAM_USERNAME")
+                password = get_secret("INSTAGRAM_PASSWORD")
                 # username = os.getenv("INSTAGRAM_USERNAME", "placeholder")
                 # password = os.getenv("INSTAGRAM_PASSWORD", "placeholder")
                 self.insta_loader.login(username, password)
@@ -151,7 +148,9 @@ class FetchToAddInstagramAudioTool(BaseTool):
         temp_audio_path = None
         try:
             # Download video
-            response = requests.get(video_url, timeout=30)
+            with track("http", "instagram.video") as call:
+                response = requests.get(video_url, timeout=30)
+                call.bytes = len(response.content)
             if response.status_code != 200:
                 raise Exception(f"Failed to download video: Status code {response.status_code}")
             
@@ -167,12 +166,18 @@ class FetchToAddInstagramAudioTool(BaseTool):
             # Save to temporary file
             temp_audio_path = self._process_audio(audio_buffer)
             
+            # embedchain's audio loader reads the Deepgram key from the environment
+            get_secret("DEEPGRAM_API_KEY")
+
             # Add to embedchain with metadata
-            self.app.add(
-                temp_audio_path,
-                data_type="audio",
-                metadata=post_metadata
-            )
+            with track("ingest", "app.add:audio") as call:
+                call.bytes = os.path.getsize(temp_audio_path)
+                self.app.add(
+                    temp_audio_path,
+                    data_type="audio",
+                    metadata=post_metadata
+                )
+            source_registry.add(self.app, post_metadata["source"])
             
             logger.info(f"Successfully processed video: {video_url}")
             return True
@@ -186,6 +191,7 @@ class FetchToAddInstagramAudioTool(BaseTool):
 
     def _run(self, instagram_username: str) -> FetchToAddInstagramAudioOutput:
         processed_videos = []
+        skipped_sources = []
         errors = []
         total_posts = 0
         
@@ -203,9 +209,13 @@ class FetchToAddInstagramAudioTool(BaseTool):
                 total_posts += 1
                 
                 try:
-                    if post.is_video and post.video_url:
+                    source = f"https://www.instagram.com/p/{post.shortcode}/"
+                    if post.is_video and source_registry.contains(self.app, source):
+                        logger.info(f"Post already in vector DB, skipping: {source}")
+                        skipped_sources.append(source)
+                    elif post.is_video and post.video_url:
                         post_metadata = {
-                            "source": f"https://www.instagram.com/p/{post.shortcode}/",
+                            **partition_metadata(self.app, source, SOURCE_TYPE_INSTAGRAM_AUDIO),
                             "caption": post.caption if post.caption else "",
                             "timestamp": post.date_utc.isoformat(),
                             "likes": post.likes,
@@ -225,17 +235,21 @@ class FetchToAddInstagramAudioTool(BaseTool):
                     errors.append(error_msg)
                     continue
 
-            success = len(processed_videos) > 0
+            success = len(processed_videos) > 0 or len(skipped_sources) > 0
             error_message = "; ".join(errors) if errors else ""
             
-            logger.info(f"Processed {len(processed_videos)} videos out of {total_posts} total posts")
+            logger.info(
+                f"Processed {len(processed_videos)} videos out of {total_posts} total posts "
+                f"({len(skipped_sources)} already in the vector database)"
+            )
             
             return FetchToAddInstagramAudioOutput(
                 processed_videos=processed_videos,
                 success=success,
                 error_message=error_message,
                 total_posts_found=total_posts,
-                total_videos_processed=len(processed_videos)
+                total_videos_processed=len(processed_videos),
+                skipped_sources=skipped_sources
             )
 
         except Exception as e:
@@ -246,7 +260,8 @@ class FetchToAddInstagramAudioTool(BaseTool):
                 success=False,
                 error_message=error_message,
                 total_posts_found=total_posts,
-                total_videos_processed=0
+                total_videos_processed=0,
+                skipped_sources=skipped_sources
             )
 
     def _handle_error(self, error: Exception) -> str:
@@ -7,9 +7,9 @@ from pydantic.v1 import BaseModel, Field
 from crewai_tools.tools.base_tool import BaseTool
 import openai
 import os
-import streamlit as st
-import streamlit as st
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
+from smartfunnel.tools.settings import get_secret
+from smartfunnel.tools.async_rag import get_async_openai
+from smartfunnel.tools.instrumentation import add_usage, track
 
 class ValueObject(BaseModel):
     name: str = Field(
@@ -503,9 +503,9 @@ class PromptingRagTool(BaseTool):
         except Exception:
             return input_string
 
-    def _run(self, **kwargs) -> dict:
-        """Run the tool with the given inputs."""
-        if not OPENAI_API_KEY:
+    def _build_messages(self, **kwargs) -> Union[List[Dict[str, str]], dict]:
+        """Build the chat messages for the given inputs, or return the tool's reply when there is nothing to send."""
+        if not get_secret("OPENAI_API_KEY"):
         # if not os.getenv("OPENAI_API_KEY"):
             raise ValueError("OPENAI_API_KEY environment variable is not set")
 
@@ -592,28 +592,57 @@ class PromptingRagTool(BaseTool):
             IMPORTANT: The [values] section is a list of values that the creator has. Use it to personalize the text.
             """
 
-            try:
+            return [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+
+        except Exception as e:
+            return {"text": f"Error processing input: {str(e)}"}
+
+    def _run(self, **kwargs) -> dict:
+        """Run the tool with the given inputs."""
+        messages = self._build_messages(**kwargs)
+        if isinstance(messages, dict):
+            return messages
+
+        try:
+            with track("llm", "gpt-4o-mini:prompting_rag") as call:
                 response = openai.chat.completions.create(
                     model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
+                    messages=messages,
                     temperature=0.6,
                     max_tokens=6000
                 )
+                add_usage(call, response.usage)
 
-                generated_text = response.choices[0].message.content.strip()
-                return {"text": generated_text}
-
-            except Exception as e:
-                return {"text": f"Error generating text with OpenAI: {str(e)}"}
+            generated_text = response.choices[0].message.content.strip()
+            return {"text": generated_text}
 
         except Exception as e:
-            return {"text": f"Error processing input: {str(e)}"}
+            return {"text": f"Error generating text with OpenAI: {str(e)}"}
+
+    async def _arun(self, **kwargs) -> dict:
+        """Async _run, using the shared AsyncOpenAI client."""
+        messages = self._build_messages(**kwargs)
+        if isinstance(messages, dict):
+            return messages
 
-    def _arun(self, *args, **kwargs):
-        raise NotImplementedError("Async version not implemented")
+        try:
+            with track("llm", "gpt-4o-mini:prompting_rag") as call:
+                response = await get_async_openai().chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=0.6,
+                    max_tokens=6000
+                )
+                add_usage(call, response.usage)
+
+            generated_text = response.choices[0].message.content.strip()
+            return {"text": generated_text}
+
+        except Exception as e:
+            return {"text": f"Error generating text with OpenAI: {str(e)}"}
 # import ast
 # import json
 # import re
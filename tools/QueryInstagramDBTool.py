@@ -1,32 +1,38 @@
-from typing import List, Type, Optional, Union
-from datetime import datetime, timedelta
-import tempfile
-import random
-import time
+from typing import TYPE_CHECKING, Any, Dict, List, Type, Optional, Union
+import asyncio
 import logging
-from pathlib import Path
-import socket
-import instaloader
-import requests
-from moviepy.editor import VideoFileClip
 from pydantic.v1 import BaseModel, Field, PrivateAttr
 from crewai_tools.tools.base_tool import BaseTool
-from embedchain import App
+from smartfunnel.tools.answer_cache import cached_query_many
+from smartfunnel.tools.retrieval import DEFAULT_TOP_K, format_chunks, retrieve_many
+from smartfunnel.tools.async_rag import acached_query_many, aretrieve_many
+from smartfunnel.tools.partitions import INSTAGRAM_SOURCE_TYPES, ensure_partition_tags, partition_where
+
+if TYPE_CHECKING:
+    from embedchain import App
 # from crewai_tools.tools.base_tool import BaseTool
 # from pydantic.v1 import BaseModel, Field, PrivateAttr
 # from typing import Type, Union
 # from embedchain import App
 # import logging
 
+# Sent to the LLM only; the answer cache and retrieval work on the question itself
+PROMPT_TEMPLATE = """Please analyze the following query about the Instagram content: {question}
+            Focus on providing specific examples and quotes from the posts."""
+
 class QueryInstagramDBInput(BaseModel):
     """Input for QueryInstagramDB."""
-    query: str = Field(..., description="The query to search the Instagram content database")
+    query: str = Field(default="", description="The query to search the Instagram content database")
+    queries: List[str] = Field(default_factory=list, description="Several queries to answer concurrently in a single call")
+    retrieval_only: bool = Field(default=False, description="Return the top-k raw post transcripts with their sources and similarity scores instead of a synthesized answer")
+    k: int = Field(default=DEFAULT_TOP_K, description="Number of chunks to return in retrieval-only mode")
 
 class QueryInstagramDBOutput(BaseModel):
     """Output for QueryInstagramDB."""
     response: str = Field(..., description="The response from the query")
     error_message: str = Field(default="", description="Error message if the operation failed")
     success: bool = Field(..., description="Whether the operation was successful")
+    responses: Dict[str, str] = Field(default_factory=dict, description="Responses keyed by query, when several queries were sent")
 
 # class QueryInstagramDBInput(BaseModel):
 #     query: str = Field(..., description="The query to search the Instagram content database")
@@ -38,54 +44,137 @@ class QueryInstagramDBOutput(BaseModel):
 
 class QueryInstagramDBTool(BaseTool):
     name: str = "Query Instagram DB"
-    description: str = "Queries the Instagram content database with provided input"
+    description: str = (
+        "Queries the Instagram content database with provided input. "
+        "Pass all your questions at once in queries to have them answered concurrently."
+    )
     args_schema: Type[QueryInstagramDBInput] = QueryInstagramDBInput
-    _app: Optional[App] = Field(default=None, exclude=True)
+    _app: Optional[Any] = Field(default=None, exclude=True)
+    max_workers: int = Field(default=5, description="Maximum number of queries answered concurrently")
     
     model_config = {
         'arbitrary_types_allowed': True
     }
     
-    def __init__(self, app: App):
+    def __init__(self, app: "App"):
         super().__init__()
         self._app = app
     
-    def _run(self, query: Union[str, QueryInstagramDBInput], **kwargs) -> QueryInstagramDBOutput:
-        try:
-            query_text = query.query if isinstance(query, QueryInstagramDBInput) else query
-            
-            enhanced_query = f"""Please analyze the following query about the Instagram content: {query_text}
-            Focus on providing specific examples and quotes from the posts."""
-            
-            response = self._app.query(enhanced_query)
-            
-            answer = response[0] if isinstance(response, tuple) else response
-            
-            if not answer or (isinstance(answer, str) and answer.strip() == ""):
+    def _format_answer(self, response) -> Optional[str]:
+        answer = response[0] if isinstance(response, tuple) else response
+        if not answer or (isinstance(answer, str) and answer.strip() == ""):
+            return None
+        return f"""
+Answer: {answer}
+
+Note: This response is based on the processed Instagram content."""
+
+    def _questions(self, query, queries, retrieval_only, k):
+        if isinstance(query, QueryInstagramDBInput):
+            query, queries, retrieval_only, k = query.query, query.queries, query.retrieval_only, query.k
+        questions = list(dict.fromkeys(([query] if query else []) + list(queries or [])))
+        return questions, retrieval_only, k
+
+    def _responses(self, answers: Dict[str, Any]) -> Dict[str, str]:
+        responses = {}
+        for question, response in answers.items():
+            formatted_response = self._format_answer(response)
+            if formatted_response:
+                responses[question] = formatted_response
+        return responses
+
+    def _output(self, questions: List[str], responses: Dict[str, str], errors: Dict[str, str]) -> QueryInstagramDBOutput:
+        if len(questions) == 1:
+            question = questions[0]
+            if question in errors:
+                return QueryInstagramDBOutput(response="", success=False, error_message=errors[question])
+            if question not in responses:
                 return QueryInstagramDBOutput(
                     response="No relevant content found in the processed posts.",
                     success=False,
                     error_message="No content found"
                 )
-            
-            formatted_response = f"""
-Answer: {answer}
+            return QueryInstagramDBOutput(response=responses[question], success=True)
 
-Note: This response is based on the processed Instagram content."""
-            
-            return QueryInstagramDBOutput(response=formatted_response, success=True)
-        except ValueError as ve:
+        for question in questions:
+            if question not in responses and question not in errors:
+                responses[question] = "No relevant content found in the processed posts."
+        return QueryInstagramDBOutput(
+            response=f"Answered {len(responses)} of {len(questions)} queries, see responses.",
+            success=bool(responses) and not errors,
+            error_message="; ".join(f"{question}: {error}" for question, error in errors.items()),
+            responses=responses
+        )
+
+    def _error_output(self, e: Exception) -> QueryInstagramDBOutput:
+        if isinstance(e, ValueError):
             return QueryInstagramDBOutput(
                 response="",
                 success=False,
                 error_message="No content has been added to the database yet."
             )
+        return QueryInstagramDBOutput(
+            response="",
+            success=False,
+            error_message=str(e)
+        )
+
+    def _run(
+        self,
+        query: Union[str, QueryInstagramDBInput] = "",
+        queries: Optional[List[str]] = None,
+        retrieval_only: bool = False,
+        k: int = DEFAULT_TOP_K,
+        **kwargs
+    ) -> QueryInstagramDBOutput:
+        questions, retrieval_only, k = self._questions(query, queries, retrieval_only, k)
+        if not questions:
+            return QueryInstagramDBOutput(response="", success=False, error_message="No query provided")
+        try:
+            # Only the active creator's Instagram audio and captions, not their YouTube transcripts
+            ensure_partition_tags(self._app)
+            where = partition_where(self._app, *INSTAGRAM_SOURCE_TYPES)
+            if retrieval_only:
+                retrieved = retrieve_many(self._app, questions, k=k, where=where)
+                responses = {question: format_chunks(chunks) for question, chunks in retrieved.items() if chunks}
+                errors = {}
+            else:
+                answers, errors = cached_query_many(
+                    self._app, questions, max_workers=self.max_workers, where=where,
+                    template=PROMPT_TEMPLATE
+                )
+                responses = self._responses(answers)
         except Exception as e:
-            return QueryInstagramDBOutput(
-                response="",
-                success=False,
-                error_message=str(e)
-            )
+            return self._error_output(e)
+        return self._output(questions, responses, errors)
+
+    async def _arun(
+        self,
+        query: Union[str, QueryInstagramDBInput] = "",
+        queries: Optional[List[str]] = None,
+        retrieval_only: bool = False,
+        k: int = DEFAULT_TOP_K,
+        **kwargs
+    ) -> QueryInstagramDBOutput:
+        questions, retrieval_only, k = self._questions(query, queries, retrieval_only, k)
+        if not questions:
+            return QueryInstagramDBOutput(response="", success=False, error_message="No query provided")
+        try:
+            await asyncio.to_thread(ensure_partition_tags, self._app)
+            where = partition_where(self._app, *INSTAGRAM_SOURCE_TYPES)
+            if retrieval_only:
+                retrieved = await aretrieve_many(self._app, questions, k=k, where=where)
+                responses = {question: format_chunks(chunks) for question, chunks in retrieved.items() if chunks}
+                errors = {}
+            else:
+                answers, errors = await acached_query_many(
+                    self._app, questions, max_concurrency=self.max_workers, where=where,
+                    template=PROMPT_TEMPLATE
+                )
+                responses = self._responses(answers)
+        except Exception as e:
+            return self._error_output(e)
+        return self._output(questions, responses, errors)
 # class QueryInstagramDBTool(BaseTool):
 #     name: str = "Query Instagram DB"
 #     description: str = "Queries the Instagram content database with provided input"
@@ -1,35 +1,110 @@
 from crewai_tools.tools.base_tool import BaseTool
 from pydantic.v1 import BaseModel, Field
-from typing import Any, Type
-from embedchain import App
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Type
+import asyncio
 import logging
+from smartfunnel.tools.answer_cache import cached_query_many
+from smartfunnel.tools.retrieval import DEFAULT_TOP_K, format_chunks, retrieve_many
+from smartfunnel.tools.async_rag import acached_query_many, aretrieve_many
+from smartfunnel.tools.diversity import DEFAULT_MAX_PER_SOURCE, Diversity
+from smartfunnel.tools.partitions import YOUTUBE_SOURCE_TYPES, ensure_partition_tags, partition_where
+
+if TYPE_CHECKING:
+    from embedchain import App
 
 logger = logging.getLogger(__name__)
 
 class QueryVectorDBInput(BaseModel):
-    query: str = Field(..., description="The query to search the vector DB.")
+    query: str = Field(default="", description="The query to search the vector DB.")
+    queries: List[str] = Field(default_factory=list, description="Several queries to answer concurrently in a single call.")
+    retrieval_only: bool = Field(default=False, description="Return the top-k raw transcript chunks with their sources and similarity scores instead of a synthesized answer.")
+    k: int = Field(default=DEFAULT_TOP_K, description="Number of chunks to return in retrieval-only mode.")
+    diverse: bool = Field(default=False, description="Draw on more videos for broad questions: favour chunks that add new material over near-repeats of the best match.")
+    max_per_source: int = Field(default=DEFAULT_MAX_PER_SOURCE, description="With diverse, the most chunks taken from a single video.")
 
 class QueryVectorDBOutput(BaseModel):
     reply: str = Field(..., description="The reply from the query.")
     error_message: str = Field(default="", description="Error message if the operation failed.")
+    replies: Dict[str, str] = Field(default_factory=dict, description="Replies keyed by query, when several queries were sent.")
 
 class QueryVectorDBTool(BaseTool):
     name: str = "Query Vector DB"
-    description: str = "Queries the vector database with the given input."
+    description: str = (
+        "Queries the vector database with the given input. "
+        "Pass all your questions at once in queries to have them answered concurrently."
+    )
     args_schema: Type[QueryVectorDBInput] = QueryVectorDBInput
     app: Any = Field(default=None, exclude=True)
+    max_workers: int = Field(default=5, description="Maximum number of queries answered concurrently.")
 
-    def __init__(self, app: App, **data):
+    def __init__(self, app: "App", **data):
         super().__init__(**data)
         self.app = app
 
-    def _run(self, query: str) -> QueryVectorDBOutput:
+    def _questions(self, query: str, queries: Optional[List[str]]) -> List[str]:
+        return list(dict.fromkeys(([query] if query else []) + list(queries or [])))
+
+    def _output(self, questions: List[str], replies: Dict[str, str], errors: Dict[str, str]) -> QueryVectorDBOutput:
+        logger.info(f"Query completed successfully")
+        error_message = "; ".join(f"{question}: {error}" for question, error in errors.items())
+        if len(questions) == 1:
+            return QueryVectorDBOutput(reply=replies.get(questions[0], "Error occurred"), error_message=error_message)
+        return QueryVectorDBOutput(
+            reply=f"Answered {len(replies)} of {len(questions)} queries, see replies.",
+            error_message=error_message,
+            replies=replies
+        )
+
+    def _run(
+        self, query: str = "", queries: Optional[List[str]] = None, retrieval_only: bool = False, k: int = DEFAULT_TOP_K,
+        diverse: bool = False, max_per_source: int = DEFAULT_MAX_PER_SOURCE
+    ) -> QueryVectorDBOutput:
+        questions = self._questions(query, queries)
+        if not questions:
+            return QueryVectorDBOutput(reply="Error occurred", error_message="No query provided.")
+        try:
+            logger.info(f"Querying vector DB with {len(questions)} queries: {questions}")
+            # Only the active creator's YouTube transcripts, not their Instagram content
+            ensure_partition_tags(self.app)
+            where = partition_where(self.app, *YOUTUBE_SOURCE_TYPES)
+            diversity = Diversity(max_per_source=max_per_source) if diverse else None
+            if retrieval_only:
+                # The agent sees the output as text, so the chunks are rendered once, with scores and sources
+                retrieved = retrieve_many(self.app, questions, k=k, where=where, diversity=diversity)
+                replies = {question: format_chunks(chunks) for question, chunks in retrieved.items()}
+                errors = {}
+            else:
+                replies, errors = cached_query_many(
+                    self.app, questions, max_workers=self.max_workers, where=where, diversity=diversity
+                )
+            return self._output(questions, replies, errors)
+        except Exception as e:
+            error_message = f"Failed to query vector DB: {str(e)}"
+            logger.error(error_message)
+            return QueryVectorDBOutput(reply="Error occurred", error_message=error_message)
+
+    async def _arun(
+        self, query: str = "", queries: Optional[List[str]] = None, retrieval_only: bool = False, k: int = DEFAULT_TOP_K,
+        diverse: bool = False, max_per_source: int = DEFAULT_MAX_PER_SOURCE
+    ) -> QueryVectorDBOutput:
+        questions = self._questions(query, queries)
+        if not questions:
+            return QueryVectorDBOutput(reply="Error occurred", error_message="No query provided.")
         try:
-            logger.info(f"Querying vector DB with: {query}")
-            reply = self.app.query(query)
-            logger.info(f"Query completed successfully")
-            return QueryVectorDBOutput(reply=reply)
+            logger.info(f"Querying vector DB with {len(questions)} queries: {questions}")
+            await asyncio.to_thread(ensure_partition_tags, self.app)
+            where = partition_where(self.app, *YOUTUBE_SOURCE_TYPES)
+            diversity = Diversity(max_per_source=max_per_source) if diverse else None
+            if retrieval_only:
+                retrieved = await aretrieve_many(self.app, questions, k=k, where=where, diversity=diversity)
+                replies = {question: format_chunks(chunks) for question, chunks in retrieved.items()}
+                errors = {}
+            else:
+                replies, errors = await acached_query_many(
+                    self.app, questions, max_concurrency=self.max_workers, where=where, diversity=diversity
+                )
+            return self._output(questions, replies, errors)
         except Exception as e:
             error_message = f"Failed to query vector DB: {str(e)}"
             logger.error(error_message)
-            return QueryVectorDBOutput(reply="Error occurred", error_message=error_message)
\ No newline at end of file
+            return QueryVectorDBOutput(reply="Error occurred", error_message=error_message)
@@ -0,0 +1,355 @@
+import array
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from smartfunnel.tools.diversity import Diversity
+from smartfunnel.tools.instrumentation import bind_run
+from smartfunnel.tools.query_translation import translate_queries, translate_query
+from smartfunnel.tools.retrieval import answer_query
+from smartfunnel.tools.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+# ada-002 puts unrelated questions around 0.75-0.85, paraphrases above 0.95
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+DEFAULT_MAX_WORKERS = 5
+# Latest lookups kept in gptcache_report, for inspecting what matched what
+MAX_REPORT_ROWS = 1000
+
+# Same tables as GPTCache's SQL storage (the schema of the shipped sqlite.db).
+# The scope of a question is kept as a "scope" dependency in gptcache_question_dep.
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS gptcache_question ("
+    " id INTEGER NOT NULL, question VARCHAR(3000) NOT NULL, create_on DATETIME,"
+    " last_access DATETIME, embedding_data BLOB, deleted INTEGER, PRIMARY KEY (id))",
+    "CREATE TABLE IF NOT EXISTS gptcache_answer ("
+    " id INTEGER NOT NULL, question_id INTEGER NOT NULL, answer VARCHAR(3000) NOT NULL,"
+    " answer_type INTEGER NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE IF NOT EXISTS gptcache_question_dep ("
+    " id INTEGER NOT NULL, question_id INTEGER NOT NULL, dep_name VARCHAR(1000) NOT NULL,"
+    " dep_data VARCHAR(3000) NOT NULL, dep_type INTEGER NOT NULL, PRIMARY KEY (id))",
+    "CREATE TABLE IF NOT EXISTS gptcache_report ("
+    " id INTEGER NOT NULL, user_question VARCHAR(3000) NOT NULL, cache_question_id INTEGER NOT NULL,"
+    " cache_question VARCHAR(3000) NOT NULL, cache_answer VARCHAR(3000) NOT NULL,"
+    " similarity FLOAT NOT NULL, cache_delta_time FLOAT NOT NULL, cache_time DATETIME,"
+    " extra VARCHAR(3000), PRIMARY KEY (id))",
+    "CREATE INDEX IF NOT EXISTS gptcache_question_dep_scope ON gptcache_question_dep (dep_name, dep_data)",
+    "CREATE INDEX IF NOT EXISTS gptcache_answer_question ON gptcache_answer (question_id)",
+    "CREATE INDEX IF NOT EXISTS gptcache_question_text ON gptcache_question (question)",
+    # Lookup counters behind stats(), so the capped report is never scanned
+    "CREATE TABLE IF NOT EXISTS answer_cache_stats ("
+    " scope TEXT NOT NULL, kind TEXT NOT NULL, lookups INTEGER NOT NULL, PRIMARY KEY (scope, kind))",
+]
+SCOPE_DEP = "scope"
+
+
+def _now() -> str:
+    return datetime.now().isoformat(sep=" ")
+
+
+def _normalize(question: str) -> str:
+    return " ".join(question.split())
+
+
+def _similarities(embedding: Sequence[float], blobs: Sequence[bytes]):
+    """Cosine similarity of an embedding to each stored float32 embedding blob, as a NumPy array."""
+    # NumPy is only imported on a semantic lookup, keeping it off the crew's startup path
+    import numpy as np
+
+    query = np.asarray(embedding, dtype=np.float32)
+    matrix = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(len(blobs), query.size)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    return np.where(norms > 0, matrix @ query / np.where(norms > 0, norms, 1.0), 0.0)
+
+
+class AnswerCache:
+    """
+    Exact plus semantic cache of RAG answers, stored in the GPTCache tables.
+
+    Questions are scoped (creator collection and corpus version), so an
+    answer is never served for another creator or for a corpus that has
+    changed since. A question that is not an exact match is answered from
+    the most similar cached question of its scope above
+    similarity_threshold. Entries expire after ttl_seconds and are evicted
+    least recently used first beyond max_entries. Every lookup is counted
+    in answer_cache_stats, and the latest MAX_REPORT_ROWS are recorded in
+    gptcache_report.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_entries: int = DEFAULT_MAX_ENTRIES,
+        similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+    ):
+        self.path = str(path or data_path("sqlite.db"))
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+
+    def _candidates(self, scope: str) -> List[Tuple[int, str, bytes, str]]:
+        cutoff = (datetime.now() - timedelta(seconds=self.ttl_seconds)).isoformat(sep=" ")
+        return self._conn.execute(
+            "SELECT q.id, q.question, q.embedding_data, a.answer FROM gptcache_question q"
+            " JOIN gptcache_question_dep d ON d.question_id = q.id"
+            " JOIN gptcache_answer a ON a.question_id = q.id"
+            " WHERE d.dep_name = ? AND d.dep_data = ? AND q.deleted = 0 AND q.create_on >= ?",
+            (SCOPE_DEP, scope, cutoff),
+        ).fetchall()
+
+    def _report(self, scope: str, question: str, match, similarity: float, started: float, kind: str):
+        # The answer is not copied into the report, it stays in gptcache_answer
+        question_id, cached_question, _ = match or (0, "", "")
+        self._conn.execute(
+            "INSERT INTO answer_cache_stats (scope, kind, lookups) VALUES (?, ?, 1)"
+            " ON CONFLICT (scope, kind) DO UPDATE SET lookups = lookups + 1",
+            (scope, kind),
+        )
+        self._conn.execute(
+            "INSERT INTO gptcache_report (user_question, cache_question_id, cache_question,"
+            " cache_answer, similarity, cache_delta_time, cache_time, extra)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                question, question_id, cached_question, "", similarity,
+                time.perf_counter() - started, _now(), json.dumps({"scope": scope, "hit": kind}),
+            ),
+        )
+        self._conn.execute(
+            "DELETE FROM gptcache_report WHERE id <= (SELECT MAX(id) FROM gptcache_report) - ?", (MAX_REPORT_ROWS,)
+        )
+
+    def lookup_exact(self, scope: str, question: str) -> Optional[str]:
+        """Return the cached answer of the exact same question, without embedding it."""
+        question = _normalize(question)
+        started = time.perf_counter()
+        cutoff = (datetime.now() - timedelta(seconds=self.ttl_seconds)).isoformat(sep=" ")
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT q.id, a.answer FROM gptcache_question q"
+                " JOIN gptcache_question_dep d ON d.question_id = q.id"
+                " JOIN gptcache_answer a ON a.question_id = q.id"
+                " WHERE q.question = ? AND d.dep_name = ? AND d.dep_data = ? AND q.deleted = 0 AND q.create_on >= ?"
+                " ORDER BY q.id DESC LIMIT 1",
+                (question, SCOPE_DEP, scope, cutoff),
+            ).fetchone()
+            if row is None:
+                return None
+            question_id, answer = row
+            with self._conn:
+                self._touch(question_id)
+                self._report(scope, question, (question_id, question, answer), 1.0, started, "exact")
+        return answer
+
+    def lookup_similar(self, scope: str, question: str, embedding: Sequence[float]) -> Optional[str]:
+        """Return the answer of the most similar cached question above the threshold."""
+        question = _normalize(question)
+        started = time.perf_counter()
+        with self._lock:
+            candidates = self._candidates(scope)
+        # Embeddings of another dimension come from another backend and cannot match
+        size = len(embedding) * array.array("f").itemsize
+        candidates = [candidate for candidate in candidates if candidate[2] and len(candidate[2]) == size]
+        best, best_similarity = None, 0.0
+        if candidates:
+            # Scored outside the lock, so concurrent lookups are not serialized
+            similarities = _similarities(embedding, [blob for _, _, blob, _ in candidates])
+            index = int(similarities.argmax())
+            question_id, cached_question, _, answer = candidates[index]
+            best, best_similarity = (question_id, cached_question, answer), float(similarities[index])
+        hit = best is not None and best_similarity >= self.similarity_threshold
+        with self._lock:
+            with self._conn:
+                if hit:
+                    self._touch(best[0])
+                self._report(scope, question, best if hit else None, best_similarity, started,
+                             "semantic" if hit else "miss")
+        if hit:
+            logger.info(f"Answer cache hit ({best_similarity:.3f}): {question!r} ~ {best[1]!r}")
+            return best[2]
+        return None
+
+    def _touch(self, question_id: int):
+        self._conn.execute(
+            "UPDATE gptcache_question SET last_access = ? WHERE id = ?", (_now(), question_id)
+        )
+
+    def put(self, scope: str, question: str, answer: str, embedding: Sequence[float]):
+        """Cache the answer to a question within a scope."""
+        now = _now()
+        with self._lock:
+            with self._conn:
+                question_id = self._conn.execute(
+                    "INSERT INTO gptcache_question (question, create_on, last_access, embedding_data, deleted)"
+                    " VALUES (?, ?, ?, ?, 0)",
+                    (_normalize(question), now, now, array.array("f", embedding).tobytes()),
+                ).lastrowid
+                self._conn.execute(
+                    "INSERT INTO gptcache_answer (question_id, answer, answer_type) VALUES (?, ?, 0)",
+                    (question_id, answer),
+                )
+                self._conn.execute(
+                    "INSERT INTO gptcache_question_dep (question_id, dep_name, dep_data, dep_type)"
+                    " VALUES (?, ?, ?, 0)",
+                    (question_id, SCOPE_DEP, scope),
+                )
+                self._evict()
+
+    def _evict(self):
+        cutoff = (datetime.now() - timedelta(seconds=self.ttl_seconds)).isoformat(sep=" ")
+        victims = [row[0] for row in self._conn.execute(
+            "SELECT id FROM gptcache_question WHERE create_on < ? OR deleted != 0", (cutoff,)
+        )]
+        excess = self._conn.execute(
+            "SELECT COUNT(*) FROM gptcache_question WHERE create_on >= ? AND deleted = 0", (cutoff,)
+        ).fetchone()[0] - self.max_entries
+        if excess > 0:
+            victims += [row[0] for row in self._conn.execute(
+                "SELECT id FROM gptcache_question WHERE create_on >= ? AND deleted = 0"
+                " ORDER BY last_access ASC LIMIT ?",
+                (cutoff, excess),
+            )]
+        if not victims:
+            return
+        params = [(question_id,) for question_id in victims]
+        self._conn.executemany("DELETE FROM gptcache_answer WHERE question_id = ?", params)
+        self._conn.executemany("DELETE FROM gptcache_question_dep WHERE question_id = ?", params)
+        self._conn.executemany("DELETE FROM gptcache_question WHERE id = ?", params)
+        logger.info(f"Evicted {len(victims)} answers from the cache")
+
+    def stats(self, scope: Optional[str] = None) -> dict:
+        """Return lookup counts and hit rates from answer_cache_stats, optionally for one scope."""
+        with self._lock:
+            counts = dict(self._conn.execute(
+                "SELECT kind, SUM(lookups) FROM answer_cache_stats WHERE ? IS NULL OR scope = ? GROUP BY kind",
+                (scope, scope),
+            ).fetchall())
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM gptcache_question WHERE deleted = 0"
+            ).fetchone()[0]
+        # Exact misses are not counted, each one is followed by a semantic lookup
+        exact, semantic, miss = (counts.get(kind, 0) for kind in ("exact", "semantic", "miss"))
+        lookups = exact + semantic + miss
+        return {
+            "lookups": lookups,
+            "exact_hits": exact,
+            "semantic_hits": semantic,
+            "hit_rate": (exact + semantic) / lookups if lookups else 0.0,
+            "entries": entries,
+        }
+
+
+_answer_cache: Optional[AnswerCache] = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """Return the process-wide answer cache."""
+    global _answer_cache
+    if _answer_cache is None:
+        _answer_cache = AnswerCache()
+    return _answer_cache
+
+
+def corpus_scope(
+    app, where: Optional[Dict[str, Any]] = None, diversity: Optional[Diversity] = None,
+    template: Optional[str] = None,
+) -> str:
+    """
+    Scope of cached answers: the creator collection and its chunk count,
+    which changes whenever content is added to it, plus the partition
+    filter and diversity settings the answer was retrieved with and the
+    prompt template it was asked with.
+    """
+    scope = f"{app.db.config.collection_name}@{app.db.count()}"
+    if where:
+        scope += f"#{json.dumps(where, sort_keys=True)}"
+    if diversity:
+        scope += f"~{diversity.key()}"
+    if template:
+        scope += f"?{hashlib.sha1(template.encode()).hexdigest()[:12]}"
+    return scope
+
+
+def cached_query(
+    app, question: str, cache: Optional[AnswerCache] = None, embedding: Optional[Sequence[float]] = None,
+    where: Optional[Dict[str, Any]] = None, search_text: Optional[str] = None,
+    diversity: Optional[Diversity] = None, template: Optional[str] = None,
+):
+    """
+    Answer a question like app.query (with hybrid retrieval), reusing a
+    cached answer to the same or a near-identical question over the same
+    corpus. embedding is the vector of search_text, the translated question.
+    template only shapes the prompt sent to the LLM: the cache and the
+    retrieval work on the question itself.
+    """
+    cache = cache or get_answer_cache()
+    scope = corpus_scope(app, where, diversity, template)
+    answer = cache.lookup_exact(scope, question)
+    if answer is not None:
+        return answer
+    search_text = search_text or translate_query(question)
+    if embedding is None:
+        # Goes through the embedding cache, so later lookups reuse this vector
+        embedding = app.embedding_model.embedding_fn([search_text])[0]
+    answer = cache.lookup_similar(scope, question, embedding)
+    if answer is not None:
+        return answer
+    answer = answer_query(
+        app, question, embedding=embedding, where=where, search_text=search_text, diversity=diversity,
+        template=template,
+    )
+    if isinstance(answer, str) and answer.strip():
+        cache.put(scope, question, answer, embedding)
+    return answer
+
+
+def cached_query_many(
+    app, questions: List[str], cache: Optional[AnswerCache] = None, max_workers: int = DEFAULT_MAX_WORKERS,
+    where: Optional[Dict[str, Any]] = None, diversity: Optional[Diversity] = None,
+    template: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Answer several questions concurrently. All questions are translated
+    and embedded in one request each up front, so neither the cache lookups
+    nor the retrieval inside app.query do it again. Returns (answers,
+    errors), both keyed by question.
+    """
+    questions = list(dict.fromkeys(questions))
+    if not questions:
+        return {}, {}
+    translations = translate_queries(questions)
+    embeddings = app.embedding_model.embedding_fn([translations[question] for question in questions])
+
+    def answer(item):
+        question, embedding = item
+        try:
+            return question, cached_query(
+                app, question, cache=cache, embedding=embedding, where=where,
+                search_text=translations[question], diversity=diversity, template=template,
+            ), None
+        except Exception as e:
+            logger.error(f"Failed to answer {question!r}: {str(e)}")
+            return question, None, str(e)
+
+    answers, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(questions))) as executor:
+        for question, reply, error in executor.map(bind_run(answer), zip(questions, embeddings)):
+            if error is None:
+                answers[question] = reply
+            else:
+                errors[question] = error
+    return answers, errors
@@ -0,0 +1,250 @@
+"""
+Asyncio counterparts of the embedding, retrieval and answer paths used by
+the tools' _arun methods.
+
+OpenAI calls go through a shared AsyncOpenAI client, so many tool calls
+(and many creators) can be in flight on one event loop. Chroma runs in
+process and has no async API, so its searches and writes, like the
+SQLite cache lookups, are handed to the default thread pool.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from smartfunnel.tools.answer_cache import AnswerCache, corpus_scope, get_answer_cache
+from smartfunnel.tools.bulk_ingest import DEFAULT_BATCH_SIZE, DEFAULT_MAX_BATCH_TOKENS, pack_batches
+from smartfunnel.tools.chroma_db_init import EMBEDDING_BACKEND
+from smartfunnel.tools.query_translation import (
+    CORPUS_LANGUAGE,
+    TRANSLATION_MODEL,
+    get_translation_cache,
+    parse_translations,
+    translation_messages,
+)
+from smartfunnel.tools.context_assembly import assemble_context
+from smartfunnel.tools.diversity import Diversity
+from smartfunnel.tools.instrumentation import add_usage, track
+from smartfunnel.tools.retrieval import (
+    DEFAULT_TOP_K,
+    RetrievedChunk,
+    llm_question,
+    llm_where,
+    log_context,
+    search_many,
+)
+from smartfunnel.tools.settings import get_secret
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 5
+
+_async_openai = None
+
+
+def get_async_openai():
+    """Return the process-wide AsyncOpenAI client, creating it on first use."""
+    global _async_openai
+    if _async_openai is None:
+        from openai import AsyncOpenAI
+        _async_openai = AsyncOpenAI(api_key=get_secret("OPENAI_API_KEY"))
+    return _async_openai
+
+
+async def aembed_chunks(
+    app,
+    texts: Sequence[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+) -> Tuple[List[List[float]], int]:
+    """
+    Embed texts through the app's embedding cache, sending the misses in
+    packed, concurrent requests. Returns the vectors and the request count.
+    """
+    embedding_fn = app.embedding_model.embedding_fn
+    # Unwrap the CachedEmbeddingFunction installed by install_embedding_cache
+    cache = getattr(embedding_fn, "cache", None)
+    model = getattr(embedding_fn, "model", None)
+    inner_fn = getattr(embedding_fn, "_embedding_fn", embedding_fn)
+
+    texts = list(texts)
+    vectors = await asyncio.to_thread(cache.get_many, model, texts) if cache else [None] * len(texts)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if not missing:
+        return vectors, 0
+
+    missing_texts = [texts[i] for i in missing]
+    batches = pack_batches(missing_texts, batch_size, max_batch_tokens)
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def embed(batch):
+        async with semaphore:
+            batch_texts = missing_texts[batch[0]:batch[1]]
+            with track("embedding", model or EMBEDDING_BACKEND) as call:
+                if EMBEDDING_BACKEND == "openai":
+                    response = await get_async_openai().embeddings.create(
+                        model=app.embedding_model.config.model, input=batch_texts
+                    )
+                    add_usage(call, response.usage)
+                    return [item.embedding for item in response.data]
+                # Local backends are CPU bound
+                return await asyncio.to_thread(inner_fn, batch_texts)
+
+    results = await asyncio.gather(*(embed(batch) for batch in batches))
+    embedded = [list(vector) for batch_vectors in results for vector in batch_vectors]
+    if cache:
+        await asyncio.to_thread(cache.put_many, model, missing_texts, embedded)
+    for i, vector in zip(missing, embedded):
+        vectors[i] = vector
+    return vectors, len(batches)
+
+
+async def aembed(app, texts: Sequence[str]) -> List[List[float]]:
+    vectors, _ = await aembed_chunks(app, texts)
+    return vectors
+
+
+async def atranslate_queries(queries: Sequence[str], language: Optional[str] = None) -> Dict[str, str]:
+    """Async translate_queries: cache misses go out in one AsyncOpenAI completion."""
+    queries = list(dict.fromkeys(queries))
+    language = CORPUS_LANGUAGE if language is None else language
+    if not language or not queries:
+        return {query: query for query in queries}
+    cache = get_translation_cache()
+    translations = await asyncio.to_thread(cache.get_many, queries, language)
+    missing = [query for query in queries if query not in translations]
+    if missing:
+        try:
+            with track("llm", f"{TRANSLATION_MODEL}:translate_queries") as call:
+                response = await get_async_openai().chat.completions.create(
+                    model=TRANSLATION_MODEL,
+                    messages=translation_messages(missing, language),
+                    temperature=0,
+                    response_format={"type": "json_object"},
+                )
+                add_usage(call, response.usage)
+            translated = parse_translations(response.choices[0].message.content, missing)
+            await asyncio.to_thread(cache.put_many, translated, language)
+            translations.update(translated)
+            logger.info(f"Translated {len(translated)} queries into {language}")
+        except Exception as e:
+            logger.error(f"Failed to translate queries, searching them untranslated: {str(e)}")
+    return {query: translations.get(query, query) for query in queries}
+
+
+async def aretrieve_many(
+    app, queries: List[str], k: int = DEFAULT_TOP_K, where: Optional[Dict[str, Any]] = None,
+    diversity: Optional[Diversity] = None,
+) -> Dict[str, List[RetrievedChunk]]:
+    """Async retrieve_many: one translation, one embedding request, one batched Chroma query."""
+    queries = list(dict.fromkeys(queries))
+    if not queries:
+        return {}
+    translations = await atranslate_queries(queries)
+    texts = [translations[query] for query in queries]
+    embeddings = await aembed(app, texts)
+    return await asyncio.to_thread(search_many, app, queries, embeddings, k, where, texts=texts, diversity=diversity)
+
+
+async def aquery(
+    app, question: str, embedding: Optional[List[float]] = None, where: Optional[Dict[str, Any]] = None,
+    search_text: Optional[str] = None, diversity: Optional[Diversity] = None, template: Optional[str] = None,
+) -> str:
+    """
+    Async App.query: retrieves the same number of chunks (ranked by the
+    hybrid search over the translated question), assembles them like
+    answer_query and sends the same prompt, system prompt and sampling
+    settings from the app's LLM config.
+    """
+    config = app.llm.config
+    search_text = search_text or (await atranslate_queries([question]))[question]
+    if embedding is None:
+        embedding = (await aembed(app, [search_text]))[0]
+    retrieved = await asyncio.to_thread(
+        search_many, app, [question], [embedding], config.number_documents, {**llm_where(app), **(where or {})},
+        texts=[search_text], diversity=diversity,
+    )
+    context = assemble_context(retrieved[question])
+    log_context(question, context)
+    prompt = config.prompt.substitute(context=" | ".join(context.contexts), query=llm_question(question, template))
+
+    messages = []
+    if config.system_prompt:
+        messages.append({"role": "system", "content": config.system_prompt})
+    messages.append({"role": "user", "content": prompt})
+    model = config.model or "gpt-4o-mini"
+    with track("llm", f"{model}:answer_query") as call:
+        response = await get_async_openai().chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=config.temperature,
+            max_tokens=config.max_tokens,
+            top_p=config.top_p,
+        )
+        add_usage(call, response.usage)
+    return response.choices[0].message.content
+
+
+async def acached_query(
+    app, question: str, cache: Optional[AnswerCache] = None, embedding: Optional[List[float]] = None,
+    where: Optional[Dict[str, Any]] = None, search_text: Optional[str] = None,
+    diversity: Optional[Diversity] = None, template: Optional[str] = None,
+) -> str:
+    """Async cached_query: reuses a cached answer to the same or a near-identical question."""
+    cache = cache or get_answer_cache()
+    scope = await asyncio.to_thread(corpus_scope, app, where, diversity, template)
+    answer = await asyncio.to_thread(cache.lookup_exact, scope, question)
+    if answer is not None:
+        return answer
+    search_text = search_text or (await atranslate_queries([question]))[question]
+    if embedding is None:
+        embedding = (await aembed(app, [search_text]))[0]
+    answer = await asyncio.to_thread(cache.lookup_similar, scope, question, embedding)
+    if answer is not None:
+        return answer
+    answer = await aquery(
+        app, question, embedding=embedding, where=where, search_text=search_text, diversity=diversity,
+        template=template,
+    )
+    if isinstance(answer, str) and answer.strip():
+        await asyncio.to_thread(cache.put, scope, question, answer, embedding)
+    return answer
+
+
+async def acached_query_many(
+    app,
+    questions: List[str],
+    cache: Optional[AnswerCache] = None,
+    max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+    where: Optional[Dict[str, Any]] = None,
+    diversity: Optional[Diversity] = None,
+    template: Optional[str] = None,
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Async cached_query_many. Returns (answers, errors), both keyed by question."""
+    questions = list(dict.fromkeys(questions))
+    if not questions:
+        return {}, {}
+    translations = await atranslate_queries(questions)
+    embeddings = await aembed(app, [translations[question] for question in questions])
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def answer(question, embedding):
+        async with semaphore:
+            try:
+                return question, await acached_query(
+                    app, question, cache=cache, embedding=embedding, where=where,
+                    search_text=translations[question], diversity=diversity, template=template,
+                ), None
+            except Exception as e:
+                logger.error(f"Failed to answer {question!r}: {str(e)}")
+                return question, None, str(e)
+
+    answers, errors = {}, {}
+    for question, reply, error in await asyncio.gather(
+        *(answer(question, embedding) for question, embedding in zip(questions, embeddings))
+    ):
+        if error is None:
+            answers[question] = reply
+        else:
+            errors[question] = error
+    return answers, errors
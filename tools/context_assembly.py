@@ -0,0 +1,167 @@
+"""
+Assembly of retrieved chunks into the contexts sent to the answering LLM.
+
+Consecutive chunks of a transcript share their overlap, and neighbouring
+top-k hits often repeat the same span, which is billed as input tokens on
+every query. Before synthesis, chunks of the same source that overlap (or
+contain one another) are merged into one passage, near-duplicates are
+dropped and the rest is packed, best ranked first, into a token budget.
+"""
+import logging
+import os
+import re
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from pydantic.v1 import BaseModel, Field
+from smartfunnel.tools.chunking import split_units, token_length
+
+if TYPE_CHECKING:
+    from smartfunnel.tools.retrieval import RetrievedChunk
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONTEXT_TOKENS = int(os.getenv("SMARTFUNNEL_CONTEXT_TOKENS", "1500"))
+# Shortest shared span treated as a chunk overlap rather than a coincidence
+MIN_OVERLAP_CHARS = 40
+# Share of a passage's word trigrams found in a better ranked passage above
+# which it is dropped as a near-duplicate
+DUPLICATE_THRESHOLD = 0.8
+
+
+class AssembledContext(BaseModel):
+    contexts: List[str] = Field(default_factory=list, description="Passages to send to the LLM, best ranked first.")
+    raw_tokens: int = Field(default=0, description="Tokens of the retrieved chunks as they were.")
+    tokens: int = Field(default=0, description="Tokens of the assembled contexts.")
+    merged: int = Field(default=0, description="Chunks merged into an overlapping chunk of the same source.")
+    dropped: int = Field(default=0, description="Near-duplicate chunks dropped.")
+    truncated: int = Field(default=0, description="Passages cut or left out to fit the token budget.")
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.raw_tokens - self.tokens
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _overlap(left: str, right: str) -> int:
+    """Length of the longest suffix of left that is a prefix of right."""
+    if len(right) < MIN_OVERLAP_CHARS:
+        return 0
+    probe = right[:MIN_OVERLAP_CHARS]
+    start = left.find(probe)
+    while start != -1:
+        # The earliest match gives the longest overlap
+        if right.startswith(left[start:]):
+            return len(left) - start
+        start = left.find(probe, start + 1)
+    return 0
+
+
+def merge_overlapping(left: str, right: str) -> Optional[str]:
+    """Merge two passages of the same source if they overlap or one contains the other."""
+    if right in left:
+        return left
+    if left in right:
+        return right
+    overlap = _overlap(left, right)
+    if overlap:
+        return left + right[overlap:]
+    overlap = _overlap(right, left)
+    if overlap:
+        return right + left[overlap:]
+    return None
+
+
+def _shingles(text: str) -> Set[Tuple[str, ...]]:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _pack(text: str, budget: int) -> str:
+    """The leading sentences (or words, for unpunctuated captions) of text that fit in budget tokens."""
+    units = split_units(text)
+    if units and token_length(units[0]) > budget:
+        units = text.split()
+    packed: List[str] = []
+    for unit in units:
+        # Measured joined, as tokens can merge across the separator
+        if token_length(" ".join(packed + [unit])) > budget:
+            break
+        packed.append(unit)
+    return " ".join(packed)
+
+
+def assemble_context(chunks: List["RetrievedChunk"], token_budget: Optional[int] = None) -> AssembledContext:
+    """Merge, deduplicate and pack ranked chunks into at most token_budget tokens of context."""
+    token_budget = DEFAULT_CONTEXT_TOKENS if token_budget is None else token_budget
+    report = AssembledContext(raw_tokens=sum(token_length(chunk.text) for chunk in chunks))
+
+    # (source, text) in rank order; a merged passage keeps the rank of its best chunk
+    passages: List[Tuple[str, str]] = []
+    for chunk in chunks:
+        text = _normalize(chunk.text)
+        position = len(passages)
+        i = 0
+        while i < len(passages):
+            source, passage = passages[i]
+            merged = merge_overlapping(passage, text) if chunk.source and source == chunk.source else None
+            if merged is None:
+                i += 1
+                continue
+            # The merged passage may now bridge another passage of the source
+            passages.pop(i)
+            text = merged
+            position = min(position, i)
+            report.merged += 1
+            i = 0
+        passages.insert(position, (chunk.source, text))
+
+    kept: List[str] = []
+    kept_shingles: List[Set[Tuple[str, ...]]] = []
+    for _, passage in passages:
+        shingles = _shingles(passage)
+        if any(len(shingles & other) >= DUPLICATE_THRESHOLD * len(shingles) for other in kept_shingles):
+            report.dropped += 1
+            continue
+        kept.append(passage)
+        kept_shingles.append(shingles)
+
+    for passage in kept:
+        remaining = max(0, token_budget - report.tokens)
+        length = token_length(passage)
+        if length > remaining:
+            report.truncated += 1
+            passage = _pack(passage, remaining) if remaining else ""
+            if not passage:
+                continue
+            length = token_length(passage)
+        report.contexts.append(passage)
+        report.tokens += length
+    _record(report)
+    return report
+
+
+_totals: Dict[str, int] = {"queries": 0, "raw_tokens": 0, "tokens": 0, "merged": 0, "dropped": 0}
+_totals_lock = threading.Lock()
+
+
+def _record(report: AssembledContext):
+    with _totals_lock:
+        _totals["queries"] += 1
+        _totals["raw_tokens"] += report.raw_tokens
+        _totals["tokens"] += report.tokens
+        _totals["merged"] += report.merged
+        _totals["dropped"] += report.dropped
+
+
+def context_stats() -> Dict[str, int]:
+    """Context tokens retrieved and sent, and tokens saved, over the queries of this process."""
+    with _totals_lock:
+        stats = dict(_totals)
+    stats["tokens_saved"] = stats["raw_tokens"] - stats["tokens"]
+    return stats
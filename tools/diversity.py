@@ -0,0 +1,78 @@
+"""
+Diversity-aware selection of retrieved chunks.
+
+Broad questions ("what are the creator's values") tend to rank k chunks of
+the same video first. Maximal marginal relevance trades each candidate's
+relevance against its similarity to the chunks already picked, and a
+per-source cap bounds how many chunks a single video contributes, so one
+query covers more of the corpus.
+"""
+import os
+from typing import List, Optional, Sequence
+
+from pydantic.v1 import BaseModel, Field
+
+DEFAULT_MMR_LAMBDA = float(os.getenv("SMARTFUNNEL_MMR_LAMBDA", "0.5"))
+DEFAULT_MAX_PER_SOURCE = int(os.getenv("SMARTFUNNEL_MAX_PER_SOURCE", "2"))
+
+
+class Diversity(BaseModel):
+    lambda_mult: float = Field(
+        default=DEFAULT_MMR_LAMBDA,
+        description="Weight of relevance against novelty: 1 ranks by relevance only, 0 by novelty only.",
+    )
+    max_per_source: Optional[int] = Field(
+        default=DEFAULT_MAX_PER_SOURCE, description="Most chunks selected from one source (None for no cap)."
+    )
+
+    def key(self) -> str:
+        return f"mmr{self.lambda_mult:g}/{self.max_per_source}"
+
+
+def mmr_select(
+    embeddings: Sequence[Sequence[float]],
+    relevance: Sequence[float],
+    sources: Sequence[str],
+    k: int,
+    diversity: Diversity,
+) -> List[int]:
+    """
+    Return the indices of k candidates picked by maximal marginal relevance.
+
+    relevance is each candidate's score for the query, scaled to [0, 1],
+    and sources the source of each candidate. Candidates of a source that
+    reached its cap are skipped while others remain; if every source is
+    capped before k are picked, the best remaining candidates fill the rest.
+    """
+    # NumPy is only imported when diversity is asked for, keeping it off the crew's startup path
+    import numpy as np
+
+    n = len(embeddings)
+    if n == 0 or k <= 0:
+        return []
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.where(norms == 0, 1.0, norms)
+    similarity = vectors @ vectors.T
+    relevance = np.asarray(relevance, dtype=np.float32)
+    _, source_codes = np.unique(np.asarray(sources, dtype=object), return_inverse=True)
+    source_counts = np.zeros(source_codes.max() + 1, dtype=np.int32)
+
+    selected: List[int] = []
+    available = np.ones(n, dtype=bool)
+    # Highest similarity of each candidate to the chunks selected so far
+    redundancy = np.zeros(n, dtype=np.float32)
+    while len(selected) < min(k, n):
+        allowed = available
+        if diversity.max_per_source is not None:
+            uncapped = available & (source_counts[source_codes] < diversity.max_per_source)
+            if uncapped.any():
+                allowed = uncapped
+        scores = diversity.lambda_mult * relevance - (1.0 - diversity.lambda_mult) * redundancy
+        scores = np.where(allowed, scores, -np.inf)
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        source_counts[source_codes[best]] += 1
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
@@ -0,0 +1,121 @@
+"""
+Pluggable embedding backends for the embedchain app.
+
+A backend is a Chroma embedding function (called with a list of texts,
+returning a list of vectors) that also exposes `model_name` and
+`dimensions`. "openai" keeps the embedder from the embedchain config;
+"local" is a CPU-only hashed n-gram embedder for offline runs, tests and
+large backfills.
+
+    python -m smartfunnel.tools.embedders   # throughput comparison
+"""
+import logging
+import math
+import os
+import re
+import time
+import zlib
+from collections import Counter
+from typing import Callable, Dict, List, Sequence
+
+from chromadb import Documents, EmbeddingFunction, Embeddings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIMENSIONS = 768
+
+
+class HashingEmbeddingFunction(EmbeddingFunction):
+    """
+    Embeds text with the hashing trick over word unigrams, word bigrams and
+    character n-grams, with sublinear term frequency and L2 normalization.
+    Deterministic across processes and needs no model download.
+    """
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS, char_ngrams: Sequence[int] = (3, 4, 5)):
+        self.dimensions = dimensions
+        self.char_ngrams = tuple(char_ngrams)
+        self.model_name = f"local-hashing-{dimensions}"
+
+    def _features(self, text: str) -> Counter:
+        words = re.findall(r"\w+", text.lower())
+        features = Counter(f"w:{word}" for word in words)
+        features.update(f"b:{a} {b}" for a, b in zip(words, words[1:]))
+        padded = f" {' '.join(words)} "
+        for n in self.char_ngrams:
+            features.update(f"c:{padded[i:i + n]}" for i in range(len(padded) - n + 1))
+        return features
+
+    def embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for feature, count in self._features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if (h // self.dimensions) & 1 else -1.0
+            vector[h % self.dimensions] += sign * (1.0 + math.log(count))
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return [self.embed(text) for text in input]
+
+
+EMBEDDING_BACKENDS: Dict[str, Callable[[], EmbeddingFunction]] = {
+    "local": HashingEmbeddingFunction,
+}
+
+
+def install_embedding_function(app, embedding_fn: EmbeddingFunction):
+    """Replace the embedding function of an embedchain app and rebind its collection."""
+    embedder = app.embedding_model
+    embedder.set_embedding_fn(embedding_fn)
+    embedder.set_vector_dimension(embedding_fn.dimensions)
+    app.db.set_collection_name(app.db.config.collection_name)
+    logger.info(f"Using embedding backend: {embedding_fn.model_name}")
+
+
+def install_embedding_backend(app, name: str):
+    """Install a named backend; "openai" keeps the embedder built from the config."""
+    if name == "openai":
+        return
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name}")
+    install_embedding_function(app, EMBEDDING_BACKENDS[name]())
+
+
+def measure_throughput(embedding_fn: Callable[[List[str]], List[List[float]]], texts: List[str], batch_size: int = 100) -> Dict:
+    """Embed texts in batches and report chunks and characters per second."""
+    started = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        embedding_fn(texts[i:i + batch_size])
+    seconds = time.perf_counter() - started
+    return {
+        "chunks": len(texts),
+        "seconds": seconds,
+        "chunks_per_second": len(texts) / seconds if seconds else 0.0,
+        "chars_per_second": sum(len(text) for text in texts) / seconds if seconds else 0.0,
+    }
+
+
+def main():
+    from smartfunnel.tools.chunking import TokenChunker
+    from smartfunnel.tools.chunking_benchmark import generate_corpus
+
+    chunker = TokenChunker()
+    texts = [
+        chunk
+        for transcripts, _ in generate_corpus(creators=2, videos=10, seed=7)
+        for transcript in transcripts
+        for chunk in chunker.split_text(transcript)
+    ]
+    backends = {"local": HashingEmbeddingFunction()}
+    if os.getenv("OPENAI_API_KEY"):
+        from chromadb.utils.embedding_functions import OpenAIEmbeddingFunction
+        backends["openai"] = OpenAIEmbeddingFunction(
+            api_key=os.environ["OPENAI_API_KEY"], model_name="text-embedding-ada-002"
+        )
+    for name, embedding_fn in backends.items():
+        print(name, measure_throughput(embedding_fn, texts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import array
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from chromadb import Documents, EmbeddingFunction, Embeddings
+from smartfunnel.tools.chunking import token_length
+from smartfunnel.tools.instrumentation import track
+from smartfunnel.tools.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+# 512 MB is roughly 85k ada-002 vectors stored as float32
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache backed by SQLite.
+
+    Entries are keyed by (model, sha256(chunk text)) and evicted least
+    recently used first once the stored vectors exceed max_bytes.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = str(path or data_path("embedding_cache.sqlite3"))
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " model TEXT NOT NULL,"
+                " text_hash TEXT NOT NULL,"
+                " vector BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (model, text_hash))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)"
+            )
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Return the cached vector for every text, or None where it is missing."""
+        hashes = [_text_hash(text) for text in texts]
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(hashes), 500):
+                batch = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array.array("f", blob).tolist()
+            if found:
+                now = time.time()
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                        [(now, model, text_hash) for text_hash in found],
+                    )
+            results = [found.get(text_hash) for text_hash in hashes]
+            hit_count = sum(1 for result in results if result is not None)
+            self.hits += hit_count
+            self.misses += len(results) - hit_count
+        return results
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Sequence[float]]):
+        """Store vectors for the given texts and evict old entries if needed."""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array.array("f", vector).tobytes()
+            rows.append((model, _text_hash(text), blob, len(blob), now))
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, vector, size, last_access) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        freed = 0
+        for model, text_hash, size in self._conn.execute(
+            "SELECT model, text_hash, size FROM embeddings ORDER BY last_access ASC"
+        ):
+            victims.append((model, text_hash))
+            freed += size
+            if freed >= excess:
+                break
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM embeddings WHERE model = ? AND text_hash = ?", victims
+            )
+        logger.info(f"Evicted {len(victims)} embeddings ({freed} bytes) from the cache")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the current size of the cache."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+                "bytes": size,
+            }
+
+
+class CachedEmbeddingFunction(EmbeddingFunction):
+    """Chroma embedding function that only sends cache misses to the wrapped embedder."""
+
+    def __init__(self, embedding_fn, model: str, cache: EmbeddingCache):
+        self._embedding_fn = embedding_fn
+        self.model = model
+        self.cache = cache
+
+    def __call__(self, input: Documents) -> Embeddings:
+        texts = list(input)
+        results = self.cache.get_many(self.model, texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        if missing:
+            with track("embedding", self.model) as call:
+                # The embedder does not report usage, so tokens are counted locally
+                call.tokens_in = sum(token_length(texts[i]) for i in missing)
+                vectors = self._embedding_fn([texts[i] for i in missing])
+            vectors = [list(vector) for vector in vectors]
+            self.cache.put_many(self.model, [texts[i] for i in missing], vectors)
+            for i, vector in zip(missing, vectors):
+                results[i] = vector
+        return results
+
+
+_embedding_cache: Optional[EmbeddingCache] = None
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Return the process-wide embedding cache."""
+    global _embedding_cache
+    if _embedding_cache is None:
+        _embedding_cache = EmbeddingCache()
+    return _embedding_cache
+
+
+def install_embedding_cache(app, cache: Optional[EmbeddingCache] = None) -> EmbeddingCache:
+    """Put the embedding cache in front of the embedder of an embedchain app."""
+    cache = cache or get_embedding_cache()
+    embedder = app.embedding_model
+    if not isinstance(embedder.embedding_fn, CachedEmbeddingFunction):
+        # Local backends name their own model, so their vectors get their own keys
+        model = getattr(embedder.embedding_fn, "model_name", None) or embedder.config.model
+        embedder.set_embedding_fn(
+            CachedEmbeddingFunction(embedder.embedding_fn, model, cache)
+        )
+        # Chroma binds the embedding function when the collection is opened
+        app.db.set_collection_name(app.db.config.collection_name)
+    return cache
@@ -0,0 +1,210 @@
+"""
+Per-call accounting of the LLM, embedding, ingestion and HTTP calls.
+
+Every instrumented call records its duration, tokens in and out and bytes
+transferred, keyed by the crew task running at the time, into the run of
+the current context. The records of a run are summarised by run_report,
+per task and per call, and written as JSON next to the other run data by
+write_run_report.
+"""
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+
+from pydantic.v1 import BaseModel, Field
+from smartfunnel.tools.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+# Task name of calls made before the crew starts (or outside of it)
+NO_TASK = "setup"
+
+
+class CallRecord(BaseModel):
+    task: str = Field(..., description="Crew task running when the call was made.")
+    kind: str = Field(..., description="llm, embedding, ingest or http.")
+    name: str = Field(..., description="What was called, e.g. the model or endpoint.")
+    duration: float = Field(default=0.0, description="Wall time of the call in seconds.")
+    tokens_in: int = Field(default=0, description="Prompt (or embedded) tokens.")
+    tokens_out: int = Field(default=0, description="Completion tokens.")
+    bytes: int = Field(default=0, description="Bytes downloaded or ingested.")
+    error: str = Field(default="", description="Exception type if the call failed.")
+
+
+class Run:
+    """
+    Accounting of one crew run: its call records and the task they are
+    charged to. Each run is held in a context variable, so concurrent runs
+    (e.g. two Streamlit sessions) keep their records apart.
+    """
+
+    def __init__(self, task_names: Sequence[str]):
+        self.tasks = list(task_names)
+        self.records: List[CallRecord] = []
+        self.started = time.time()
+        self.current_task = self.tasks[0] if self.tasks else NO_TASK
+        self._lock = threading.Lock()
+
+    def add(self, record: CallRecord):
+        with self._lock:
+            self.records.append(record)
+
+    def calls(self) -> List[CallRecord]:
+        with self._lock:
+            return list(self.records)
+
+    def task_completed(self, output: Any = None):
+        """The crew's task_callback: moves the accounting on to the next task."""
+        finished = self.current_task
+        index = self.tasks.index(finished) + 1 if finished in self.tasks else len(self.tasks)
+        self.current_task = self.tasks[index] if index < len(self.tasks) else NO_TASK
+        logger.info(f"Task {finished} completed, accounting calls to {self.current_task}")
+
+
+_current_run: ContextVar[Optional[Run]] = ContextVar("smartfunnel_run", default=None)
+
+
+def current_run() -> Optional[Run]:
+    return _current_run.get()
+
+
+def current_task() -> str:
+    run = current_run()
+    return run.current_task if run else NO_TASK
+
+
+def start_run(task_names: Sequence[str]) -> Run:
+    """
+    Start accounting a crew run whose tasks run in the given order, in the
+    current context. Pass the run's task_completed as the crew's
+    task_callback.
+    """
+    run = Run(task_names)
+    _current_run.set(run)
+    return run
+
+
+def bind_run(fn: Callable) -> Callable:
+    """
+    Wrap fn so it records into the caller's run when called from a worker
+    thread, which does not inherit the caller's context.
+    """
+    run = current_run()
+
+    def call(*args, **kwargs):
+        token = _current_run.set(run)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_run.reset(token)
+
+    return call
+
+
+@contextmanager
+def track(kind: str, name: str) -> Iterator[CallRecord]:
+    """
+    Time the enclosed call and record it under the current task. The caller
+    fills in tokens and bytes on the yielded record.
+    """
+    run = current_run()
+    record = CallRecord(task=run.current_task if run else NO_TASK, kind=kind, name=name)
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.error = type(e).__name__
+        raise
+    finally:
+        record.duration = time.perf_counter() - start
+        # Calls made outside of a crew run are not accounted
+        if run is not None:
+            run.add(record)
+
+
+def add_usage(record: CallRecord, usage: Any):
+    """Copy the token counts of an OpenAI/Groq usage object (or embedchain usage dict) onto a record."""
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        record.tokens_in += int(usage.get("prompt_tokens") or 0)
+        record.tokens_out += int(usage.get("completion_tokens") or 0)
+    else:
+        record.tokens_in += int(getattr(usage, "prompt_tokens", 0) or 0)
+        record.tokens_out += int(getattr(usage, "completion_tokens", 0) or 0)
+
+
+def records(run: Optional[Run] = None) -> List[CallRecord]:
+    run = run or current_run()
+    if run is None:
+        return []
+    return run.calls()
+
+
+def _totals(calls: List[CallRecord]) -> Dict[str, Any]:
+    return {
+        "calls": len(calls),
+        "errors": sum(1 for call in calls if call.error),
+        "duration": round(sum(call.duration for call in calls), 3),
+        "tokens_in": sum(call.tokens_in for call in calls),
+        "tokens_out": sum(call.tokens_out for call in calls),
+        "bytes": sum(call.bytes for call in calls),
+    }
+
+
+def run_report(run: Optional[Run] = None) -> Dict[str, Any]:
+    """Totals of a run (the current one by default), per task and, within each task, per kind and name of call."""
+    run = run or current_run() or Run([])
+    calls = records(run)
+    tasks: Dict[str, Dict[str, Any]] = {}
+    for task in list(dict.fromkeys([NO_TASK, *run.tasks, *(call.task for call in calls)])):
+        task_calls = [call for call in calls if call.task == task]
+        if not task_calls:
+            continue
+        by_call: Dict[str, List[CallRecord]] = {}
+        for call in task_calls:
+            by_call.setdefault(f"{call.kind}:{call.name}", []).append(call)
+        tasks[task] = {
+            "totals": _totals(task_calls),
+            "calls": {key: _totals(group) for key, group in by_call.items()},
+        }
+    return {
+        "started_at": datetime.fromtimestamp(run.started).isoformat(timespec="seconds"),
+        "wall_time": round(time.time() - run.started, 3),
+        "totals": _totals(calls),
+        "tasks": tasks,
+    }
+
+
+def write_run_report(path: Optional[str] = None, run: Optional[Run] = None) -> Path:
+    """Write run_report as JSON (under DATA_DIR/runs by default) and return its path."""
+    report = run_report(run)
+    # Microseconds keep the reports of concurrent runs apart
+    path = Path(path) if path else data_path("runs", f"run-{datetime.now():%Y%m%d-%H%M%S-%f}.json")
+    path.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    logger.info(f"Wrote run report to {path}")
+    return path
+
+
+def format_run_report(report: Dict[str, Any]) -> str:
+    """Render run_report as a plain text table, one row per task and call."""
+    lines = [f"{'task / call':<60} {'calls':>6} {'seconds':>9} {'tokens in':>10} {'tokens out':>10} {'bytes':>12}"]
+
+    def row(label: str, totals: Dict[str, Any]):
+        lines.append(
+            f"{label:<60} {totals['calls']:>6} {totals['duration']:>9.2f} {totals['tokens_in']:>10} "
+            f"{totals['tokens_out']:>10} {totals['bytes']:>12}"
+        )
+
+    for task, summary in report["tasks"].items():
+        row(task, summary["totals"])
+        for call, totals in summary["calls"].items():
+            row(f"  {call}", totals)
+    row("total", report["totals"])
+    return "\n".join(lines)
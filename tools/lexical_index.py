@@ -0,0 +1,164 @@
+import logging
+import math
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from smartfunnel.tools.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+# Okapi BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Function words of the (mostly French) transcripts, and English queries
+STOPWORDS = frozenset("""
+a au aux avec c ca ce ces cette d dans de des du elle en est et il ils j je l la le les leur lui m ma mais me mes moi mon n ne nous on ou par pas pour qu que qui s sa se ses si son sur t ta te tes toi ton tu un une vous y
+an and are as at be but by do for from has have he her his i in is it its me my not of on or our she so that the their them they this to was we were what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, strip accents ("Désirade" matches "desirade") and drop stopwords."""
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(c for c in folded if not unicodedata.combining(c))
+    return [term for term in re.findall(r"\w+", folded) if term not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    Persistent BM25 inverted index of chunk texts, one per Chroma collection.
+
+    Chunk ids are the Chroma ids, so lexical hits can be fused with vector
+    hits and their texts fetched from Chroma without an embedding call.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = str(path or data_path("lexical_index.sqlite3"))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS lexical_chunks ("
+                " collection TEXT NOT NULL,"
+                " chunk_id TEXT NOT NULL,"
+                " length INTEGER NOT NULL,"
+                " PRIMARY KEY (collection, chunk_id))"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS lexical_postings ("
+                " collection TEXT NOT NULL,"
+                " term TEXT NOT NULL,"
+                " chunk_id TEXT NOT NULL,"
+                " tf INTEGER NOT NULL,"
+                " PRIMARY KEY (collection, term, chunk_id))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS lexical_postings_chunk ON lexical_postings (collection, chunk_id)"
+            )
+
+    def add(self, collection_name: str, ids: Sequence[str], texts: Sequence[str]):
+        """Index (or re-index) chunks of a collection."""
+        chunk_rows, posting_rows = [], []
+        for chunk_id, text in zip(ids, texts):
+            terms = Counter(tokenize(text))
+            chunk_rows.append((collection_name, chunk_id, sum(terms.values())))
+            posting_rows.extend((collection_name, term, chunk_id, tf) for term, tf in terms.items())
+        with self._lock:
+            with self._conn:
+                self._delete(collection_name, ids)
+                self._conn.executemany(
+                    "INSERT INTO lexical_chunks (collection, chunk_id, length) VALUES (?, ?, ?)", chunk_rows
+                )
+                self._conn.executemany(
+                    "INSERT INTO lexical_postings (collection, term, chunk_id, tf) VALUES (?, ?, ?, ?)", posting_rows
+                )
+
+    def remove(self, collection_name: str, ids: Sequence[str]):
+        with self._lock:
+            with self._conn:
+                self._delete(collection_name, ids)
+
+    def _delete(self, collection_name: str, ids: Sequence[str]):
+        rows = [(collection_name, chunk_id) for chunk_id in ids]
+        self._conn.executemany("DELETE FROM lexical_chunks WHERE collection = ? AND chunk_id = ?", rows)
+        self._conn.executemany("DELETE FROM lexical_postings WHERE collection = ? AND chunk_id = ?", rows)
+
+    def indexed_ids(self, collection_name: str) -> Set[str]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute(
+                "SELECT chunk_id FROM lexical_chunks WHERE collection = ?", (collection_name,)
+            )}
+
+    def count(self, collection_name: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM lexical_chunks WHERE collection = ?", (collection_name,)
+            ).fetchone()[0]
+
+    def sync(self, collection):
+        """
+        Bring the index of a Chroma collection up to date. Chunks written by
+        App.add (Instagram audio) or before the index existed are indexed on
+        the first search that finds the counts differ.
+        """
+        if self.count(collection.name) == collection.count():
+            return
+        stored = collection.get(include=["documents"])
+        stored_ids = set(stored["ids"])
+        indexed = self.indexed_ids(collection.name)
+        missing = [(chunk_id, text) for chunk_id, text in zip(stored["ids"], stored["documents"])
+                   if chunk_id not in indexed]
+        if missing:
+            self.add(collection.name, [chunk_id for chunk_id, _ in missing], [text for _, text in missing])
+        stale = indexed - stored_ids
+        if stale:
+            self.remove(collection.name, list(stale))
+        logger.info(f"Lexical index of {collection.name}: indexed {len(missing)}, removed {len(stale)} chunks")
+
+    def search(self, collection_name: str, query: str, k: int) -> List[Tuple[str, float]]:
+        """Return the top-k (chunk_id, BM25 score) of a collection for a query."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        with self._lock:
+            total, average_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM lexical_chunks WHERE collection = ?", (collection_name,)
+            ).fetchone()
+            if not total:
+                return []
+            document_frequency: Dict[str, int] = dict(self._conn.execute(
+                f"SELECT term, COUNT(*) FROM lexical_postings WHERE collection = ? AND term IN ({placeholders}) "
+                f"GROUP BY term",
+                [collection_name, *terms],
+            ).fetchall())
+            postings = self._conn.execute(
+                f"SELECT p.chunk_id, p.term, p.tf, c.length FROM lexical_postings p "
+                f"JOIN lexical_chunks c ON c.collection = p.collection AND c.chunk_id = p.chunk_id "
+                f"WHERE p.collection = ? AND p.term IN ({placeholders})",
+                [collection_name, *terms],
+            ).fetchall()
+        average_length = average_length or 1.0
+        scores: Dict[str, float] = {}
+        for chunk_id, term, tf, length in postings:
+            df = document_frequency[term]
+            idf = math.log(1.0 + (total - df + 0.5) / (df + 0.5))
+            norm = tf + BM25_K1 * (1.0 - BM25_B + BM25_B * length / average_length)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (BM25_K1 + 1.0) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+_lexical_index: Optional[LexicalIndex] = None
+
+
+def get_lexical_index() -> LexicalIndex:
+    """Return the process-wide lexical index."""
+    global _lexical_index
+    if _lexical_index is None:
+        _lexical_index = LexicalIndex()
+    return _lexical_index
@@ -0,0 +1,73 @@
+import logging
+import threading
+from typing import Any, Dict, Set
+
+from smartfunnel.tools.chroma_db_init import creator_id_of
+
+logger = logging.getLogger(__name__)
+
+# Every chunk is tagged with the kind of content it comes from and its
+# creator, so each query tool only searches its own partition.
+SOURCE_TYPE_YOUTUBE = "youtube"
+SOURCE_TYPE_INSTAGRAM_AUDIO = "instagram_audio"
+SOURCE_TYPE_INSTAGRAM_CAPTION = "instagram_caption"
+
+YOUTUBE_SOURCE_TYPES = (SOURCE_TYPE_YOUTUBE,)
+INSTAGRAM_SOURCE_TYPES = (SOURCE_TYPE_INSTAGRAM_AUDIO, SOURCE_TYPE_INSTAGRAM_CAPTION)
+
+
+def partition_metadata(app, source: str, source_type: str) -> Dict[str, Any]:
+    """Metadata every ingestion path attaches to the chunks of a source added to the app's creator."""
+    return {"source": source, "source_type": source_type, "creator_id": creator_id_of(app)}
+
+
+def partition_where(app, *source_types: str) -> Dict[str, Any]:
+    """Flat metadata filter for the app creator's chunks of the given source types."""
+    return {
+        "source_type": source_types[0] if len(source_types) == 1 else {"$in": list(source_types)},
+        "creator_id": creator_id_of(app),
+    }
+
+
+def _source_type_for(metadata: Dict[str, Any]) -> str:
+    source = metadata.get("source") or metadata.get("url") or ""
+    if "instagram.com" in source:
+        return SOURCE_TYPE_INSTAGRAM_AUDIO if metadata.get("data_type") == "audio" else SOURCE_TYPE_INSTAGRAM_CAPTION
+    return SOURCE_TYPE_YOUTUBE
+
+
+_tagged: Set[str] = set()
+_tag_lock = threading.Lock()
+
+
+def ensure_partition_tags(app):
+    """
+    Tag the chunks of the app's current collection that were ingested
+    before partitioning (or by App.add without tags). Runs once per
+    collection and process.
+    """
+    collection = app.db.collection
+    with _tag_lock:
+        if collection.name in _tagged:
+            return
+        stored = collection.get(include=["metadatas"])
+        creator_id = creator_id_of(app)
+        ids, metadatas = [], []
+        for chunk_id, metadata in zip(stored["ids"], stored["metadatas"]):
+            metadata = dict(metadata or {})
+            tags = {"source_type": _source_type_for(metadata), "creator_id": creator_id}
+            # App.query filters on app_id, which early bulk ingestions did not set
+            if app.config.id is not None:
+                tags["app_id"] = app.config.id
+            if all(metadata.get(key) for key in tags):
+                continue
+            for key, value in tags.items():
+                metadata.setdefault(key, value)
+            ids.append(chunk_id)
+            metadatas.append(metadata)
+        max_batch = getattr(app.db.client, "max_batch_size", None) or 5000
+        for i in range(0, len(ids), max_batch):
+            collection.update(ids=ids[i:i + max_batch], metadatas=metadatas[i:i + max_batch])
+        if ids:
+            logger.info(f"Tagged {len(ids)} chunks of {collection.name} with their partition")
+        _tagged.add(collection.name)
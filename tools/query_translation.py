@@ -0,0 +1,169 @@
+"""
+Pre-retrieval query translation.
+
+The transcripts are mostly French while the agents ask in English. Queries
+are translated into the corpus language before they are embedded and
+searched, so retrieval matches the transcripts directly instead of relying
+on the answering LLM to translate after the contexts were already chosen.
+Translations are cached, so every query is translated once.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+from smartfunnel.tools.instrumentation import add_usage, track
+from smartfunnel.tools.settings import get_secret
+from smartfunnel.tools.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+# Language of the indexed content; an empty value turns translation off
+CORPUS_LANGUAGE = os.getenv("SMARTFUNNEL_CORPUS_LANGUAGE", "French")
+TRANSLATION_MODEL = os.getenv("SMARTFUNNEL_TRANSLATION_MODEL", "gpt-4o-mini")
+DEFAULT_TTL_SECONDS = 90 * 24 * 3600
+
+
+class TranslationCache:
+    """Persistent cache of query translations, keyed by (query, target language)."""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.path = str(path or data_path("query_translations.sqlite3"))
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_translations ("
+                " query TEXT NOT NULL,"
+                " language TEXT NOT NULL,"
+                " translation TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " PRIMARY KEY (query, language))"
+            )
+
+    def get_many(self, queries: Sequence[str], language: str) -> Dict[str, str]:
+        """Return the cached, unexpired translations of the queries."""
+        found = {}
+        oldest = time.time() - self.ttl_seconds
+        with self._lock:
+            for query in dict.fromkeys(queries):
+                row = self._conn.execute(
+                    "SELECT translation FROM query_translations WHERE query = ? AND language = ? AND created_at >= ?",
+                    (query, language, oldest),
+                ).fetchone()
+                if row is not None:
+                    found[query] = row[0]
+        return found
+
+    def put_many(self, translations: Dict[str, str], language: str):
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO query_translations (query, language, translation, created_at) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(query, language, translation, now) for query, translation in translations.items()],
+                )
+
+
+_translation_cache: Optional[TranslationCache] = None
+_openai = None
+
+
+def get_translation_cache() -> TranslationCache:
+    """Return the process-wide translation cache."""
+    global _translation_cache
+    if _translation_cache is None:
+        _translation_cache = TranslationCache()
+    return _translation_cache
+
+
+def _get_openai():
+    global _openai
+    if _openai is None:
+        from openai import OpenAI
+        _openai = OpenAI(api_key=get_secret("OPENAI_API_KEY"))
+    return _openai
+
+
+def translation_messages(queries: List[str], language: str) -> List[Dict[str, str]]:
+    """Chat messages asking for all queries to be translated in one completion."""
+    return [
+        {
+            "role": "system",
+            "content": (
+                f"Translate search queries into {language} for a search over {language} video transcripts. "
+                f"Keep names, brands and places unchanged. Queries already in {language} are returned as they are. "
+                'Reply with a JSON object {"translations": {"<query>": "<translation>", ...}} '
+                "keyed by every query exactly as given."
+            ),
+        },
+        {"role": "user", "content": json.dumps(queries, ensure_ascii=False)},
+    ]
+
+
+def parse_translations(content: str, queries: List[str]) -> Dict[str, str]:
+    """
+    Map each query to its translation. Queries the reply has no usable
+    translation for are left out, so they are searched untranslated and not
+    cached.
+    """
+    try:
+        raw = json.loads(content).get("translations", {})
+    except (ValueError, AttributeError):
+        logger.warning(f"Could not parse query translations: {content!r}")
+        return {}
+    if not isinstance(raw, dict):
+        logger.warning(f"Query translations are not keyed by query: {content!r}")
+        return {}
+    translations = {
+        query: raw[query].strip()
+        for query in queries
+        if isinstance(raw.get(query), str) and raw[query].strip()
+    }
+    missing = len(queries) - len(translations)
+    if missing:
+        logger.warning(f"No translation for {missing} of {len(queries)} queries")
+    return translations
+
+
+def translate_queries(
+    queries: Sequence[str], language: Optional[str] = None, cache: Optional[TranslationCache] = None
+) -> Dict[str, str]:
+    """
+    Return {query: translation into the corpus language}. Cache misses are
+    translated together in a single completion; failures leave the query
+    untranslated rather than failing the search.
+    """
+    queries = list(dict.fromkeys(queries))
+    language = CORPUS_LANGUAGE if language is None else language
+    if not language or not queries:
+        return {query: query for query in queries}
+    cache = cache or get_translation_cache()
+    translations = cache.get_many(queries, language)
+    missing = [query for query in queries if query not in translations]
+    if missing:
+        try:
+            with track("llm", f"{TRANSLATION_MODEL}:translate_queries") as call:
+                response = _get_openai().chat.completions.create(
+                    model=TRANSLATION_MODEL,
+                    messages=translation_messages(missing, language),
+                    temperature=0,
+                    response_format={"type": "json_object"},
+                )
+                add_usage(call, response.usage)
+            translated = parse_translations(response.choices[0].message.content, missing)
+            cache.put_many(translated, language)
+            translations.update(translated)
+            logger.info(f"Translated {len(translated)} queries into {language}")
+        except Exception as e:
+            logger.error(f"Failed to translate queries, searching them untranslated: {str(e)}")
+    return {query: translations.get(query, query) for query in queries}
+
+
+def translate_query(query: str, language: Optional[str] = None) -> str:
+    return translate_queries([query], language)[query]
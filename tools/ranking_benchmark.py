@@ -0,0 +1,289 @@
+"""
+Offline benchmark of the local video pre-ranker against LLM-only ranking.
+
+Generates a synthetic channel of French videos, some of which tell the
+creator's personal story, and compares the top 10 of each strategy (the
+previous top 50 by views, and pre-ranker shortlists) with the top 10 of
+rating every video with the LLM. Offline, the LLM is simulated by an
+oracle rating drawn from the hidden labels and a fixed latency per
+completion; --llm rates the videos with Groq instead and times the real
+calls.
+
+By default titles and descriptions come from held-out templates that
+share no term with STORY_LEXICON, so the pre-ranker cannot recover the
+labels from the vocabulary the lexicon was written from. --lexicon-titles
+uses templates built from lexicon terms instead (an upper bound).
+
+    python -m smartfunnel.tools.ranking_benchmark --videos 200 --shortlists 10 20 30 40
+"""
+import argparse
+import math
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pydantic.v1 import BaseModel
+from smartfunnel.tools.video_ranking import (
+    DEFAULT_MAX_WORKERS,
+    lexicon_score,
+    prerank_scores,
+    ranking_batches,
+    score_videos,
+)
+
+STORY_TITLES = [
+    "Mon histoire : de {place} à {business}",
+    "Mon parcours d'entrepreneur, sans filtre",
+    "Je vous raconte comment j'ai tout perdu en {year}",
+    "Qui suis-je ? Mon enfance à {place}",
+    "Interview : {business}, ma vie d'avant",
+    "Podcast #{n} - mon échec le plus dur",
+    "Storytime : pourquoi j'ai quitté mon CDI",
+]
+# Story videos whose title gives nothing away
+HIDDEN_STORY_TITLES = [
+    "Ce jour-là, tout a changé",
+    "{year}, l'année où j'ai failli abandonner",
+    "Ce que personne ne sait sur {business}",
+]
+OTHER_TITLES = [
+    "5 astuces pour gagner en productivité",
+    "Tuto : créer sa boutique en ligne",
+    "Comment investir 1000€ en {year}",
+    "Review de mon nouveau setup",
+    "Vlog à {place}",
+    "Podcast #{n} - les tendances du marketing",
+    "Les 3 erreurs à éviter avec {business}",
+    "Q&A : vos questions sur l'investissement",
+]
+STORY_DESCRIPTIONS = [
+    "Dans cette vidéo je vous raconte mon parcours, mes débuts et ma famille.",
+    "Un épisode très personnel sur mon enfance et ce qui m'a construit.",
+    "Je reviens sur les coulisses de {business} et sur mes échecs.",
+]
+OTHER_DESCRIPTIONS = [
+    "Abonnez-vous et activez la cloche pour ne rien rater.",
+    "Les liens de la vidéo sont en description. Code promo : {business}.",
+    "Toutes mes astuces pour passer au niveau supérieur.",
+]
+# Held-out templates, written without STORY_LEXICON terms (checked by _held_out_templates)
+HELD_OUT_STORY_TITLES = [
+    "Retour sur mes années à {place}",
+    "Ce que mes parents m'ont appris",
+    "J'avais 19 ans et plus un centime",
+    "Pourquoi j'ai tout quitté pour {business}",
+    "Le jour où j'ai signé mon premier client",
+    "Mon père, {place} et moi",
+    "Avant {business}, il y avait un gamin de {place}",
+    "Ma plus grosse erreur en {year}",
+]
+HELD_OUT_STORY_DESCRIPTIONS = [
+    "Je n'en avais jamais parlé : d'où je viens et ce qui m'a poussé à créer {business}.",
+    "Un épisode sans filtre sur mes années difficiles à {place}.",
+    "Les moments qui m'ont forgé, racontés pour la première fois.",
+]
+HELD_OUT_OTHER_TITLES = [
+    "Les meilleurs outils pour automatiser {business}",
+    "Budget : combien coûte une boutique en {year}",
+    "Réaction à l'actualité de la semaine",
+    "Top 5 des livres à lire cet été",
+    "Live du dimanche avec vous",
+    "Faut-il investir dans l'immobilier à {place} ?",
+    "Mes 3 applis préférées en {year}",
+]
+HELD_OUT_OTHER_DESCRIPTIONS = [
+    "Tous les liens sont ci-dessous. Code promo : {business}.",
+    "Dites-moi ce que vous voulez voir ensuite.",
+    "Les chapitres de la vidéo sont juste en dessous.",
+]
+PLACES = ["La Désirade", "Pointe-à-Pitre", "Marseille", "Lyon", "Montréal", "Dakar"]
+BUSINESSES = ["On Air", "Money Boost", "Cap Liberté", "Studio Kréol", "Horizon Conseil"]
+
+
+class SyntheticVideo(BaseModel):
+    video_id: str
+    title: str
+    description: str
+    view_count: int
+    like_count: int
+    comment_count: int
+    duration_seconds: int
+    is_story: bool
+    prerank_score: float = 0.0
+
+
+def _held_out_templates() -> Tuple[List[str], List[str], List[str], List[str]]:
+    """The held-out templates, after checking that no STORY_LEXICON term occurs in them."""
+    templates = (HELD_OUT_STORY_TITLES, HELD_OUT_STORY_DESCRIPTIONS, HELD_OUT_OTHER_TITLES, HELD_OUT_OTHER_DESCRIPTIONS)
+    for template in (template for group in templates for template in group):
+        if lexicon_score(template, "") or lexicon_score("", template):
+            raise ValueError(f"Held-out template uses STORY_LEXICON terms: {template!r}")
+    return templates
+
+
+def generate_videos(count: int, story_share: float, seed: int, held_out: bool = True) -> List[SyntheticVideo]:
+    rng = random.Random(seed)
+    if held_out:
+        story_titles, story_descriptions, other_titles, other_descriptions = _held_out_templates()
+    else:
+        story_titles, story_descriptions = STORY_TITLES, STORY_DESCRIPTIONS
+        other_titles, other_descriptions = OTHER_TITLES, OTHER_DESCRIPTIONS
+    videos = []
+    for i in range(count):
+        is_story = rng.random() < story_share
+        if is_story:
+            if held_out:
+                titles = story_titles
+            else:
+                titles = HIDDEN_STORY_TITLES if rng.random() < 0.25 else story_titles
+            descriptions = story_descriptions if rng.random() < 0.6 else other_descriptions
+            duration = rng.randint(12 * 60, 90 * 60)
+        else:
+            titles, descriptions = other_titles, other_descriptions
+            duration = rng.randint(4 * 60, 25 * 60)
+        values = {
+            "place": rng.choice(PLACES),
+            "business": rng.choice(BUSINESSES),
+            "year": rng.randint(2012, 2024),
+            "n": rng.randint(1, 120),
+        }
+        views = int(rng.lognormvariate(9, 1.3))
+        engagement = rng.uniform(0.02, 0.06) if is_story else rng.uniform(0.01, 0.04)
+        videos.append(
+            SyntheticVideo(
+                video_id=f"v{i:010d}",
+                title=rng.choice(titles).format(**values),
+                description=rng.choice(descriptions).format(**values),
+                view_count=views,
+                like_count=int(views * engagement),
+                comment_count=int(views * engagement * rng.uniform(0.05, 0.2)),
+                duration_seconds=duration,
+                is_story=is_story,
+            )
+        )
+    return videos
+
+
+def simulated_ratings(videos: List[SyntheticVideo], seed: int) -> Dict[str, float]:
+    """What a good LLM rater would answer: high for story videos, low otherwise, with some noise."""
+    rng = random.Random(seed)
+    # Fractional ratings, so the top k does not depend on how ties are broken
+    return {
+        video.video_id: round(rng.uniform(6.5, 10) if video.is_story else rng.uniform(0, 4.5), 2)
+        for video in videos
+    }
+
+
+def top_ids(videos: List[SyntheticVideo], ratings: Dict[str, float], k: int) -> List[str]:
+    """Top k by rating; ties keep the order of videos, as rank_videos' stable sort does."""
+    ranked = sorted(videos, key=lambda v: ratings.get(v.video_id, 0), reverse=True)
+    return [video.video_id for video in ranked[:k]]
+
+
+def _evaluate(
+    name: str,
+    candidates: List[SyntheticVideo],
+    ratings: Dict[str, float],
+    reference: List[str],
+    stories: set,
+    prerank_seconds: float,
+    llm_seconds: float,
+    k: int,
+) -> Dict:
+    top = top_ids(candidates, ratings, k)
+    return {
+        "strategy": name,
+        "llm_videos": len(candidates),
+        "completions": len(ranking_batches(candidates)),
+        f"agreement@{k}": len(set(top) & set(reference)) / k,
+        f"story_recall@{k}": len(set(top) & stories) / min(k, len(stories) or 1),
+        "prerank_seconds": prerank_seconds,
+        "llm_seconds": llm_seconds,
+    }
+
+
+def run_benchmark(
+    videos: int = 200,
+    shortlists: Tuple[int, ...] = (10, 20, 30, 40),
+    story_share: float = 0.15,
+    k: int = 10,
+    seed: int = 7,
+    llm_latency: float = 1.5,
+    use_llm: bool = False,
+    held_out: bool = True,
+) -> Tuple[List[Dict], Optional[float]]:
+    """Rows of the benchmark table, and the Spearman correlation of pre-rank scores with the LLM ratings."""
+    channel = generate_videos(videos, story_share, seed, held_out)
+    stories = {video.video_id for video in channel if video.is_story}
+
+    def rate(candidates: List[SyntheticVideo]) -> Tuple[Dict[str, float], float]:
+        if use_llm:
+            started = time.perf_counter()
+            ratings = score_videos(candidates)
+            return ratings, time.perf_counter() - started
+        # Concurrent completions take about one completion's latency per round of workers
+        rounds = math.ceil(len(ranking_batches(candidates)) / DEFAULT_MAX_WORKERS)
+        return simulated_ratings(channel, seed), llm_latency * rounds
+
+    llm_only_ratings, llm_only_seconds = rate(channel)
+    reference = top_ids(channel, llm_only_ratings, k)
+    rows = [_evaluate("LLM only, all videos", channel, llm_only_ratings, reference, stories, 0.0,
+                      llm_only_seconds, k)]
+    popular = sorted(channel, key=lambda v: v.view_count, reverse=True)[:50]
+    ratings, llm_seconds = rate(popular)
+    rows.append(_evaluate("LLM only, top 50 by views", popular, ratings, reference, stories, 0.0, llm_seconds, k))
+
+    # Warm up, so the timing leaves out importing NumPy
+    prerank_scores(channel[:1])
+    started = time.perf_counter()
+    scores = prerank_scores(channel)
+    prerank_seconds = time.perf_counter() - started
+    for video, score in zip(channel, scores):
+        video.prerank_score = float(score)
+    preranked = sorted(channel, key=lambda v: v.prerank_score, reverse=True)
+    for size in shortlists:
+        shortlist = preranked[:size]
+        ratings, llm_seconds = rate(shortlist)
+        rows.append(_evaluate(f"pre-rank, shortlist {size}", shortlist, ratings, reference, stories,
+                              prerank_seconds, llm_seconds, k))
+
+    correlation = None
+    if not use_llm:
+        import numpy as np
+
+        def ranks(values):
+            return np.argsort(np.argsort(values, kind="stable"), kind="stable")
+
+        truth = np.array([llm_only_ratings[video.video_id] for video in channel])
+        correlation = float(np.corrcoef(ranks(scores), ranks(truth))[0, 1])
+    return rows, correlation
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--shortlists", type=int, nargs="+", default=[10, 20, 30, 40])
+    parser.add_argument("--story-share", type=float, default=0.15)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--llm-latency", type=float, default=1.5, help="Simulated seconds per completion.")
+    parser.add_argument("--llm", action="store_true", help="Rate the videos with Groq instead of simulating it.")
+    parser.add_argument(
+        "--lexicon-titles", action="store_true", help="Build titles from STORY_LEXICON terms instead of held-out ones."
+    )
+    args = parser.parse_args()
+
+    rows, correlation = run_benchmark(
+        args.videos, tuple(args.shortlists), args.story_share, args.k, args.seed, args.llm_latency, args.llm,
+        not args.lexicon_titles,
+    )
+    columns = list(rows[0].keys())
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(f"{v:.3f}" if isinstance(v, float) else str(v) for v in row.values()))
+    if correlation is not None:
+        print(f"Spearman correlation of pre-rank scores with LLM ratings: {correlation:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+import logging
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from pydantic.v1 import BaseModel, Field
+from smartfunnel.tools.context_assembly import assemble_context
+from smartfunnel.tools.diversity import Diversity, mmr_select
+from smartfunnel.tools.instrumentation import add_usage, track
+from smartfunnel.tools.lexical_index import get_lexical_index
+from smartfunnel.tools.query_translation import translate_queries, translate_query
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOP_K = 5
+
+# Hybrid retrieval: vector and BM25 rankings are fused with weighted
+# reciprocal rank fusion, each ranking adding weight / (RRF_K + rank).
+# A lexical weight of 0 gives plain vector search.
+DEFAULT_VECTOR_WEIGHT = float(os.getenv("SMARTFUNNEL_VECTOR_WEIGHT", "1.0"))
+DEFAULT_LEXICAL_WEIGHT = float(os.getenv("SMARTFUNNEL_LEXICAL_WEIGHT", "1.0"))
+RRF_K = 60
+# Candidates taken from each ranking, per result
+CANDIDATE_FACTOR = 4
+
+
+class RetrievedChunk(BaseModel):
+    text: str = Field(..., description="The chunk text.")
+    source: str = Field(default="", description="URL of the video or post the chunk comes from.")
+    score: float = Field(..., description="Cosine similarity between the query and the chunk (0 for keyword lookups).")
+    lexical_score: float = Field(default=0.0, description="BM25 score of the chunk for the query.")
+    metadata: Dict[str, Any] = Field(default_factory=dict, description="Metadata stored with the chunk.")
+
+
+def _similarity(distance: float, space: str) -> float:
+    # ada-002 and the local backends return unit vectors, so every Chroma
+    # distance maps back to the cosine similarity
+    if space == "l2":
+        return 1.0 - distance / 2.0
+    return 1.0 - distance
+
+
+def _cosine(a: Sequence[float], b: Sequence[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _chunk(text: str, metadata: Optional[Dict[str, Any]], score: float) -> RetrievedChunk:
+    metadata = metadata or {}
+    return RetrievedChunk(
+        text=text,
+        source=metadata.get("source") or metadata.get("url") or "",
+        score=score,
+        metadata=metadata,
+    )
+
+
+def where_clause(where: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Turn a flat {key: value} filter into a Chroma where clause."""
+    if not where:
+        return None
+    if len(where) == 1:
+        return dict(where)
+    return {"$and": [{key: value} for key, value in where.items()]}
+
+
+def _lexical_search(collection, index, text: str, k: int, where: Optional[Dict[str, Any]]) -> List[Tuple[str, float]]:
+    """
+    Top-k BM25 hits among the chunks matching where. The lexical index holds
+    every partition of the collection, so hits are over-fetched until k of
+    them pass the filter or the index runs out of matches.
+    """
+    if not where:
+        return index.search(collection.name, text, k)
+    fetch = k
+    while True:
+        hits = index.search(collection.name, text, fetch)
+        if not hits:
+            return []
+        allowed = set(collection.get(
+            ids=[chunk_id for chunk_id, _ in hits], where=where_clause(where), include=[]
+        )["ids"])
+        kept = [hit for hit in hits if hit[0] in allowed]
+        if len(kept) >= k or len(hits) < fetch:
+            return kept[:k]
+        fetch *= CANDIDATE_FACTOR
+
+
+def search_many(
+    app, queries: List[str], embeddings: List[List[float]], k: int = DEFAULT_TOP_K,
+    where: Optional[Dict[str, Any]] = None,
+    vector_weight: Optional[float] = None,
+    lexical_weight: Optional[float] = None,
+    texts: Optional[List[str]] = None,
+    diversity: Optional[Diversity] = None,
+) -> Dict[str, List[RetrievedChunk]]:
+    """
+    Run one batched Chroma query for already embedded queries and fuse it
+    with the BM25 ranking of the collection's lexical index. texts are the
+    strings that were embedded (the translated queries) and are searched
+    lexically too; results stay keyed by the original queries.
+
+    With diversity, the k chunks are picked from the fused candidates by
+    maximal marginal relevance, with at most max_per_source per source.
+    """
+    vector_weight = DEFAULT_VECTOR_WEIGHT if vector_weight is None else vector_weight
+    lexical_weight = DEFAULT_LEXICAL_WEIGHT if lexical_weight is None else lexical_weight
+    collection = app.db.collection
+    total = collection.count()
+    if not queries or total == 0:
+        return {query: [] for query in queries}
+    candidates = min(total, k * CANDIDATE_FACTOR) if lexical_weight or diversity else min(total, k)
+    include = ["documents", "metadatas", "distances"]
+    if diversity:
+        include.append("embeddings")
+    result = collection.query(
+        query_embeddings=[list(embedding) for embedding in embeddings],
+        n_results=candidates,
+        where=where_clause(where),
+        include=include,
+    )
+    space = (collection.metadata or {}).get("hnsw:space", "l2")
+
+    lexical, extra = {}, {}
+    if lexical_weight:
+        index = get_lexical_index()
+        index.sync(collection)
+        lexical = {
+            query: _lexical_search(collection, index, text, candidates, where)
+            for query, text in zip(queries, texts or queries)
+        }
+        # Lexical hits missing from their own query's vector results are fetched by id (and filtered
+        # by where), so a query ranks the same whichever queries share its batch
+        extra_ids = set()
+        for query, ids in zip(queries, result["ids"]):
+            vector_ids = set(ids)
+            extra_ids.update(chunk_id for chunk_id, _ in lexical[query] if chunk_id not in vector_ids)
+        if extra_ids:
+            stored = collection.get(
+                ids=list(extra_ids),
+                where=where_clause(where),
+                include=["documents", "metadatas", "embeddings"],
+            )
+            extra = {
+                chunk_id: (text, metadata, embedding)
+                for chunk_id, text, metadata, embedding in zip(
+                    stored["ids"], stored["documents"], stored["metadatas"], stored["embeddings"]
+                )
+            }
+
+    retrieved = {}
+    for i, query in enumerate(queries):
+        chunks: Dict[str, RetrievedChunk] = {}
+        fused: Dict[str, float] = {}
+        vectors: Dict[str, Sequence[float]] = {}
+        for rank, (chunk_id, text, metadata, distance) in enumerate(zip(
+            result["ids"][i], result["documents"][i], result["metadatas"][i], result["distances"][i]
+        )):
+            chunks[chunk_id] = _chunk(text, metadata, _similarity(distance, space))
+            fused[chunk_id] = vector_weight / (RRF_K + rank + 1)
+            if diversity:
+                vectors[chunk_id] = result["embeddings"][i][rank]
+        for rank, (chunk_id, bm25) in enumerate(lexical.get(query, [])):
+            if chunk_id not in chunks:
+                if chunk_id not in extra:
+                    continue
+                text, metadata, embedding = extra[chunk_id]
+                chunks[chunk_id] = _chunk(text, metadata, _cosine(embeddings[i], embedding))
+                vectors[chunk_id] = embedding
+            chunks[chunk_id].lexical_score = bm25
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + lexical_weight / (RRF_K + rank + 1)
+        ranked = sorted(fused, key=fused.get, reverse=True)
+        if diversity and ranked:
+            # Fused scores are min-max scaled to the [0, 1] relevance MMR expects
+            best, worst = fused[ranked[0]], fused[ranked[-1]]
+            picked = mmr_select(
+                [vectors[chunk_id] for chunk_id in ranked],
+                [(fused[chunk_id] - worst) / (best - worst) if best > worst else 1.0 for chunk_id in ranked],
+                [chunks[chunk_id].source or chunk_id for chunk_id in ranked],
+                k,
+                diversity,
+            )
+            top = [ranked[j] for j in picked]
+        else:
+            top = ranked[:k]
+        retrieved[query] = [chunks[chunk_id] for chunk_id in top]
+    logger.info(f"Retrieved chunks for {len(queries)} queries")
+    return retrieved
+
+
+def keyword_search(
+    app, query: str, k: int = DEFAULT_TOP_K, where: Optional[Dict[str, Any]] = None
+) -> List[RetrievedChunk]:
+    """Return the top-k chunks by BM25 alone, without an embedding call."""
+    collection = app.db.collection
+    index = get_lexical_index()
+    index.sync(collection)
+    hits = _lexical_search(collection, index, query, k, where)
+    if not hits:
+        return []
+    stored = collection.get(
+        ids=[chunk_id for chunk_id, _ in hits], where=where_clause(where), include=["documents", "metadatas"]
+    )
+    found = {
+        chunk_id: (text, metadata)
+        for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+    }
+    chunks = []
+    for chunk_id, bm25 in hits:
+        if chunk_id in found:
+            chunk = _chunk(*found[chunk_id], score=0.0)
+            chunk.lexical_score = bm25
+            chunks.append(chunk)
+    return chunks
+
+
+def llm_where(app) -> Dict[str, Any]:
+    """The filter App.query applies to retrieval: the LLM config's where plus the app id."""
+    where = dict(app.llm.config.where or {})
+    if app.config.id is not None:
+        where["app_id"] = app.config.id
+    return where
+
+
+def log_context(question: str, context) -> None:
+    logger.info(
+        f"Context for {question!r}: {context.tokens} of {context.raw_tokens} tokens, "
+        f"saved {context.tokens_saved} ({context.merged} merged, {context.dropped} duplicates dropped, "
+        f"{context.truncated} cut to the budget)"
+    )
+
+
+def llm_question(question: str, template: Optional[str] = None) -> str:
+    """The question as sent to the LLM: filled into template's {question} field, if any."""
+    return template.format(question=question) if template else question
+
+
+def answer_query(
+    app, question: str, embedding: Optional[List[float]] = None, where: Optional[Dict[str, Any]] = None,
+    search_text: Optional[str] = None, diversity: Optional[Diversity] = None, template: Optional[str] = None,
+):
+    """
+    App.query with hybrid retrieval: the same number of contexts, filter,
+    prompt and LLM, but contexts are ranked by vector and BM25 scores.
+    where narrows the search further (e.g. to a source partition).
+
+    Retrieval uses search_text, the question translated into the corpus
+    language (and embedding, its vector); the LLM gets the question as asked
+    (filled into template, if given), with the chunks merged, deduplicated
+    and packed by assemble_context.
+    """
+    search_text = search_text or translate_query(question)
+    if embedding is None:
+        embedding = app.embedding_model.embedding_fn([search_text])[0]
+    chunks = search_many(
+        app, [question], [embedding], k=app.llm.config.number_documents, where={**llm_where(app), **(where or {})},
+        texts=[search_text], diversity=diversity,
+    )[question]
+    context = assemble_context(chunks)
+    log_context(question, context)
+    with track("llm", f"{app.llm.config.model}:answer_query") as call:
+        answer = app.llm.query(llm_question(question, template), context.contexts)
+        # (answer, token usage) when token_usage is enabled in the LLM config
+        if isinstance(answer, tuple):
+            answer, usage = answer
+            add_usage(call, usage)
+    return answer
+
+
+def retrieve_many(
+    app, queries: List[str], k: int = DEFAULT_TOP_K, where: Optional[Dict[str, Any]] = None,
+    vector_weight: Optional[float] = None, lexical_weight: Optional[float] = None,
+    diversity: Optional[Diversity] = None,
+) -> Dict[str, List[RetrievedChunk]]:
+    """
+    Return the k best chunks for each query (hybrid vector + BM25 ranking)
+    without running the LLM. All queries are translated into the corpus
+    language and embedded in one request each (cache hits are not sent at
+    all) and searched in one batched Chroma query.
+    """
+    queries = list(dict.fromkeys(queries))
+    if not queries or app.db.collection.count() == 0:
+        return {query: [] for query in queries}
+    translations = translate_queries(queries)
+    texts = [translations[query] for query in queries]
+    embeddings = app.embedding_model.embedding_fn(texts)
+    return search_many(app, queries, embeddings, k=k, where=where,
+                       vector_weight=vector_weight, lexical_weight=lexical_weight, texts=texts, diversity=diversity)
+
+
+def retrieve(
+    app, query: str, k: int = DEFAULT_TOP_K, where: Optional[Dict[str, Any]] = None,
+    vector_weight: Optional[float] = None, lexical_weight: Optional[float] = None,
+    diversity: Optional[Diversity] = None,
+) -> List[RetrievedChunk]:
+    """
+    Return the k best chunks for the query without running the LLM. Costs
+    one embedding (often an embedding cache hit) and local searches.
+    """
+    return retrieve_many(app, [query], k=k, where=where, vector_weight=vector_weight,
+                         lexical_weight=lexical_weight, diversity=diversity)[query]
+
+
+def format_chunks(chunks: List[RetrievedChunk]) -> str:
+    """Render retrieved chunks as numbered evidence for an agent prompt."""
+    if not chunks:
+        return "No relevant content found."
+    return "\n\n".join(
+        f"[{i}] (score {chunk.score:.3f}, source: {chunk.source or 'unknown'})\n{chunk.text}"
+        for i, chunk in enumerate(chunks, 1)
+    )
@@ -0,0 +1,28 @@
+import os
+from functools import lru_cache
+from typing import Optional
+
+
+@lru_cache(maxsize=None)
+def get_secret(name: str) -> str:
+    """
+    Read a secret from the environment, falling back to Streamlit secrets.
+    Streamlit is only imported when the environment does not provide it,
+    and nothing is read until a secret is first needed.
+    """
+    value = os.getenv(name)
+    if value:
+        return value
+    import streamlit as st
+    value = st.secrets[name]
+    # The OpenAI SDK, langchain and embedchain's audio loader read keys from the environment
+    os.environ[name] = value
+    return value
+
+
+def get_optional_secret(name: str) -> Optional[str]:
+    """get_secret, or None when neither the environment nor Streamlit secrets provide it."""
+    try:
+        return get_secret(name)
+    except Exception:
+        return None
@@ -0,0 +1,49 @@
+import logging
+import threading
+from typing import Dict, Set
+
+logger = logging.getLogger(__name__)
+
+
+def collection_sources(collection) -> Set[str]:
+    """Return the distinct "source" metadata values stored in a Chroma collection."""
+    metadatas = collection.get(include=["metadatas"]).get("metadatas") or []
+    sources = {
+        metadata.get("source") or metadata.get("url")
+        for metadata in metadatas
+        if metadata
+    }
+    sources.discard(None)
+    return sources
+
+
+class SourceRegistry:
+    """
+    Set of already-indexed sources per Chroma collection.
+
+    Each collection is scanned once (on first lookup) for the "source"
+    metadata the ingestion tools attach, after which lookups are O(1).
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def _sources_for(self, app) -> Set[str]:
+        name = app.db.config.collection_name
+        with self._lock:
+            if name not in self._sources:
+                self._sources[name] = collection_sources(app.db.collection)
+                logger.info(f"Loaded {len(self._sources[name])} indexed sources for collection {name}")
+            return self._sources[name]
+
+    def contains(self, app, source: str) -> bool:
+        return source in self._sources_for(app)
+
+    def add(self, app, source: str):
+        sources = self._sources_for(app)
+        with self._lock:
+            sources.add(source)
+
+
+source_registry = SourceRegistry()
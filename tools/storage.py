@@ -0,0 +1,13 @@
+import os
+from pathlib import Path
+
+# Root directory for everything smartfunnel persists between runs
+# (vector store, caches, registries). Override with SMARTFUNNEL_DATA_DIR.
+DATA_DIR = Path(os.getenv("SMARTFUNNEL_DATA_DIR", Path.home() / ".smartfunnel"))
+
+
+def data_path(*parts: str) -> Path:
+    """Return a path under DATA_DIR, creating the parent directory if needed."""
+    path = DATA_DIR.joinpath(*parts)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    return path
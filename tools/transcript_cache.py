@@ -0,0 +1,128 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from smartfunnel.tools.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class TranscriptCache:
+    """
+    Persistent cache of YouTube caption entries, keyed by (video_id, language).
+
+    Entries are stored as zlib-compressed JSON, expire after ttl_seconds and
+    are evicted least recently used first once they exceed max_bytes.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttl_seconds: int = DEFAULT_TTL_SECONDS,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ):
+        self.path = str(path or data_path("transcript_cache.sqlite3"))
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts ("
+                " video_id TEXT NOT NULL,"
+                " language TEXT NOT NULL,"
+                " entries BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL,"
+                " PRIMARY KEY (video_id, language))"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS transcripts_last_access ON transcripts (last_access)"
+            )
+
+    def get(self, video_id: str, language: Optional[str] = None) -> Optional[Tuple[str, List[Dict]]]:
+        """
+        Return (language, entries) for a video, or None on a miss. Without a
+        language, the most recently cached track of the video is returned.
+        """
+        query = "SELECT language, entries, created_at FROM transcripts WHERE video_id = ?"
+        params = [video_id]
+        if language:
+            query += " AND language = ?"
+            params.append(language)
+        query += " ORDER BY created_at DESC LIMIT 1"
+        with self._lock:
+            row = self._conn.execute(query, params).fetchone()
+            if row is None:
+                return None
+            cached_language, blob, created_at = row
+            now = time.time()
+            with self._conn:
+                if now - created_at > self.ttl_seconds:
+                    self._conn.execute(
+                        "DELETE FROM transcripts WHERE video_id = ? AND language = ?",
+                        (video_id, cached_language),
+                    )
+                    return None
+                self._conn.execute(
+                    "UPDATE transcripts SET last_access = ? WHERE video_id = ? AND language = ?",
+                    (now, video_id, cached_language),
+                )
+        return cached_language, json.loads(zlib.decompress(blob).decode("utf-8"))
+
+    def put(self, video_id: str, language: str, entries: List[Dict]):
+        """Store the caption entries of a video track."""
+        blob = zlib.compress(json.dumps(entries, ensure_ascii=False).encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO transcripts "
+                    "(video_id, language, entries, size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (video_id, language, blob, len(blob), now, now),
+                )
+            self._evict(now)
+
+    def _evict(self, now: float):
+        with self._conn:
+            self._conn.execute(
+                "DELETE FROM transcripts WHERE created_at < ?", (now - self.ttl_seconds,)
+            )
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        excess = total - self.max_bytes
+        if excess <= 0:
+            return
+        victims = []
+        freed = 0
+        for video_id, language, size in self._conn.execute(
+            "SELECT video_id, language, size FROM transcripts ORDER BY last_access ASC"
+        ):
+            victims.append((video_id, language))
+            freed += size
+            if freed >= excess:
+                break
+        with self._conn:
+            self._conn.executemany(
+                "DELETE FROM transcripts WHERE video_id = ? AND language = ?", victims
+            )
+        logger.info(f"Evicted {len(victims)} transcripts ({freed} bytes) from the cache")
+
+
+_transcript_cache: Optional[TranscriptCache] = None
+
+
+def get_transcript_cache() -> TranscriptCache:
+    """Return the process-wide transcript cache."""
+    global _transcript_cache
+    if _transcript_cache is None:
+        _transcript_cache = TranscriptCache()
+    return _transcript_cache
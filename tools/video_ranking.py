@@ -0,0 +1,258 @@
+"""
+LLM relevance ranking of a channel's videos.
+
+Rather than one chat completion per video, each carrying the whole system
+prompt, videos are scored in batches: a single JSON-mode completion rates
+every video of a batch, keyed by video id. Batches are sized to a prompt
+token budget and sent concurrently, so ranking 50 videos takes one or two
+round trips.
+
+Before that, a local pre-ranker scores every fetched video at once from
+personal-story keywords, duration and engagement, and only its shortlist
+is sent to the LLM (see tools/ranking_benchmark.py for how it compares).
+"""
+import json
+import logging
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List, Sequence
+
+from smartfunnel.tools.chunking import token_length
+from smartfunnel.tools.instrumentation import add_usage, bind_run, track
+from smartfunnel.tools.settings import get_secret
+
+if TYPE_CHECKING:
+    from smartfunnel.tools.FetchRelevantVideosFromYouTubeChannelTool import VideoInfo
+
+logger = logging.getLogger(__name__)
+
+RANKING_MODEL = os.getenv("SMARTFUNNEL_RANKING_MODEL", "llama-3.1-70b-versatile")
+# Prompt tokens of the videos sent in one completion, and most videos per completion
+DEFAULT_BATCH_TOKENS = int(os.getenv("SMARTFUNNEL_RANKING_BATCH_TOKENS", "6000"))
+DEFAULT_BATCH_SIZE = 30
+DEFAULT_MAX_WORKERS = 4
+# Descriptions are cut to this many characters; the opening lines carry the topic
+MAX_DESCRIPTION_CHARS = 600
+# Completion tokens allowed per scored video ({"<11 char id>": 7, ...} takes
+# about 10), plus the wrapping object and any whitespace the model adds
+TOKENS_PER_SCORE = 24
+RESPONSE_OVERHEAD_TOKENS = 100
+# Completions re-rating the videos of a batch left without a rating
+RANKING_RETRIES = 1
+# Videos kept by the pre-ranker for LLM rating. On held-out titles (tools/ranking_benchmark.py)
+# 30 keeps the stories of the LLM-only top 10 where 20 can miss some, within DEFAULT_BATCH_SIZE videos
+DEFAULT_SHORTLIST = int(os.getenv("SMARTFUNNEL_RANKING_SHORTLIST", "30"))
+
+# Weights of personal-story terms, matched accent- and case-insensitively in
+# the title (counted twice) and description. Negative terms mark how-to and
+# product content.
+STORY_LEXICON = {
+    "mon histoire": 3, "mon parcours": 3, "parcours": 2, "ma vie": 2, "mon enfance": 3, "enfance": 1,
+    "qui suis-je": 3, "qui je suis": 2, "je vous raconte": 2, "storytime": 3, "temoignage": 2,
+    "confession": 2, "biographie": 2, "mes debuts": 2, "comment j'ai": 2, "de zero": 1, "echec": 1,
+    "famille": 1, "coulisses": 1, "interview": 2, "podcast": 2, "entretien": 2, "invite": 1,
+    "my story": 3, "my journey": 3, "how i": 2, "behind the scenes": 1,
+    "tuto": -2, "tutoriel": -2, "astuces": -1, "tips": -1, "review": -1, "unboxing": -2, "#shorts": -3,
+}
+# Weights of the pre-ranking signals, each scaled to [0, 1]
+PRERANK_WEIGHTS = {"lexicon": 0.5, "duration": 0.2, "engagement": 0.2, "popularity": 0.1}
+# Videos this long (or longer) get the full duration signal; shorts get none
+LONG_FORM_SECONDS = 3600
+SHORT_SECONDS = 60
+
+_LEXICON_PATTERN = re.compile(
+    r"(?<!\w)(" + "|".join(re.escape(term) for term in sorted(STORY_LEXICON, key=len, reverse=True)) + r")(?!\w)"
+)
+
+SYSTEM_PROMPT = (
+    "You rate YouTube videos on how likely they are to cover the personal story of their creator, "
+    "from 0 (not at all likely) to 10 (extremely likely). "
+    'Reply with a JSON object {"scores": {"<video_id>": <rating>, ...}} holding a rating for every video.'
+)
+
+_groq = None
+
+
+def _get_groq():
+    global _groq
+    if _groq is None:
+        from groq import Groq
+        _groq = Groq(api_key=get_secret("GROQ_API_KEY"))
+    return _groq
+
+
+def _video_entry(video: "VideoInfo") -> Dict[str, str]:
+    return {
+        "video_id": video.video_id,
+        "title": video.title,
+        "description": video.description[:MAX_DESCRIPTION_CHARS],
+    }
+
+
+def ranking_batches(
+    videos: Sequence["VideoInfo"], batch_tokens: int = DEFAULT_BATCH_TOKENS, batch_size: int = DEFAULT_BATCH_SIZE
+) -> List[List["VideoInfo"]]:
+    """Split videos into batches of at most batch_size videos and (about) batch_tokens prompt tokens."""
+    batches: List[List["VideoInfo"]] = []
+    batch: List["VideoInfo"] = []
+    used = 0
+    for video in videos:
+        length = token_length(json.dumps(_video_entry(video), ensure_ascii=False))
+        if batch and (used + length > batch_tokens or len(batch) >= batch_size):
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(video)
+        used += length
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def ranking_messages(videos: Sequence["VideoInfo"]) -> List[Dict[str, str]]:
+    """Chat messages asking for every video of a batch to be rated in one completion."""
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": json.dumps([_video_entry(video) for video in videos], ensure_ascii=False)},
+    ]
+
+
+def parse_scores(content: str, video_ids: Sequence[str]) -> Dict[str, float]:
+    """Map the video ids of a batch to their rating in [0, 10]; unparsable or missing ratings are left out."""
+    try:
+        raw = json.loads(content).get("scores", {})
+    except (ValueError, AttributeError):
+        logger.warning(f"Could not parse video ratings: {content!r}")
+        return {}
+    if not isinstance(raw, dict):
+        logger.warning(f"Video ratings are not keyed by video id: {content!r}")
+        return {}
+    scores = {}
+    for video_id in video_ids:
+        try:
+            score = float(raw[video_id])
+        except (KeyError, TypeError, ValueError):
+            continue
+        if 0 <= score <= 10:
+            scores[video_id] = score
+    missing = len(video_ids) - len(scores)
+    if missing:
+        logger.warning(f"No valid rating for {missing} of {len(video_ids)} videos")
+    return scores
+
+
+def _request_scores(videos: List["VideoInfo"]) -> Dict[str, float]:
+    with track("llm", f"{RANKING_MODEL}:rank_videos") as call:
+        response = _get_groq().chat.completions.create(
+            model=RANKING_MODEL,
+            messages=ranking_messages(videos),
+            max_tokens=TOKENS_PER_SCORE * len(videos) + RESPONSE_OVERHEAD_TOKENS,
+            temperature=0.2,
+            response_format={"type": "json_object"},
+        )
+        add_usage(call, response.usage)
+    return parse_scores(response.choices[0].message.content, [video.video_id for video in videos])
+
+
+def _score_batch(videos: List["VideoInfo"]) -> Dict[str, float]:
+    """
+    Rate a batch in one completion. Videos left without a valid rating (a
+    failed, truncated or malformed reply) are rated again once, in one more
+    completion, and left unrated if that fails too: at most two completions
+    per batch.
+    """
+    scores: Dict[str, float] = {}
+    for attempt in range(1 + RANKING_RETRIES):
+        missing = [video for video in videos if video.video_id not in scores]
+        if not missing:
+            break
+        if attempt:
+            logger.info(f"Rating {len(missing)} unrated videos again")
+        try:
+            scores.update(_request_scores(missing))
+        except Exception as e:
+            logger.error(f"Failed to rate a batch of {len(missing)} videos: {str(e)}")
+    return scores
+
+
+def score_videos(
+    videos: Sequence["VideoInfo"],
+    batch_tokens: int = DEFAULT_BATCH_TOKENS,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    max_workers: int = DEFAULT_MAX_WORKERS,
+) -> Dict[str, float]:
+    """Rate videos from 0 to 10, keyed by video id. Videos still unrated after the retries are left out."""
+    batches = ranking_batches(videos, batch_tokens, batch_size)
+    if not batches:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+        results = list(executor.map(bind_run(_score_batch), batches))
+    scores: Dict[str, float] = {}
+    for batch_scores in results:
+        scores.update(batch_scores)
+    logger.info(f"Rated {len(scores)} of {len(videos)} videos in {len(batches)} completions")
+    return scores
+
+
+def _fold(text: str) -> str:
+    """Lowercase text without accents, so "Témoignage" matches "temoignage"."""
+    text = unicodedata.normalize("NFKD", text.lower().replace("\u2019", "'"))
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def lexicon_score(title: str, description: str) -> float:
+    """Summed STORY_LEXICON weights of the terms in a video's title (counted twice) and description."""
+    title_terms = _LEXICON_PATTERN.findall(_fold(title))
+    description_terms = _LEXICON_PATTERN.findall(_fold(description[:MAX_DESCRIPTION_CHARS]))
+    return 2 * sum(STORY_LEXICON[term] for term in title_terms) + sum(
+        STORY_LEXICON[term] for term in description_terms
+    )
+
+
+def prerank_scores(videos: Sequence["VideoInfo"]):
+    """
+    Pre-ranking score in [0, 1] of each video, as a NumPy array. Keyword,
+    duration and engagement signals are computed over all videos at once;
+    engagement and popularity are percentile ranks among the candidates.
+    """
+    # NumPy is only imported when videos are ranked, keeping it off the crew's startup path
+    import numpy as np
+
+    n = len(videos)
+    if n == 0:
+        return np.zeros(0)
+    lexicon = np.array([lexicon_score(video.title, video.description) for video in videos], dtype=np.float64)
+    duration = np.array([video.duration_seconds for video in videos], dtype=np.float64)
+    views = np.array([video.view_count for video in videos], dtype=np.float64)
+    likes = np.array([video.like_count for video in videos], dtype=np.float64)
+    comments = np.array([video.comment_count for video in videos], dtype=np.float64)
+
+    def percentile(values):
+        if n == 1:
+            return np.ones(1)
+        return np.argsort(np.argsort(values, kind="stable"), kind="stable") / (n - 1)
+
+    signals = {
+        # Saturates at a few strong terms; negative sums count as none
+        "lexicon": 1.0 - np.exp(-np.clip(lexicon, 0, None) / 4.0),
+        # Log scale from a minute to LONG_FORM_SECONDS, so interviews and podcasts rank above clips
+        "duration": np.where(
+            duration > SHORT_SECONDS,
+            np.clip(np.log(np.maximum(duration, 1) / SHORT_SECONDS) / np.log(LONG_FORM_SECONDS / SHORT_SECONDS), 0, 1),
+            0.0,
+        ),
+        "engagement": percentile((likes + 5 * comments) / np.maximum(views, 1)),
+        "popularity": percentile(views),
+    }
+    return sum(PRERANK_WEIGHTS[name] * values for name, values in signals.items())
+
+
+def prerank_videos(videos: Sequence["VideoInfo"], shortlist: int = DEFAULT_SHORTLIST) -> List["VideoInfo"]:
+    """Set each video's prerank_score and return the shortlist best pre-ranked, best first."""
+    scores = prerank_scores(videos)
+    for video, score in zip(videos, scores):
+        video.prerank_score = round(float(score), 4)
+    ranked = sorted(videos, key=lambda v: v.prerank_score, reverse=True)
+    logger.info(f"Pre-ranked {len(videos)} videos, sending {min(shortlist, len(ranked))} to the LLM")
+    return ranked[:shortlist]
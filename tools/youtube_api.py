@@ -0,0 +1,302 @@
+"""
+YouTube Data API v3 requests shared by the YouTube tools, and the
+resolution of channel handles to channel ids.
+
+Every request is charged its quota cost (search.list costs 100 units, the
+other list calls used here 1 unit) against the project's daily quota,
+which is tracked across runs. Requests are paced by a request rate ceiling
+instead of fixed sleeps, and refused once the day's budget is spent. They
+share one pooled keep-alive session, and rate-limit errors are retried with
+exponential backoff while quota errors fail at once.
+"""
+import logging
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo
+
+import requests
+from requests.adapters import HTTPAdapter
+from smartfunnel.tools.instrumentation import bind_run, track
+from smartfunnel.tools.storage import data_path
+
+logger = logging.getLogger(__name__)
+
+API_URL = "https://www.googleapis.com/youtube/v3"
+QUOTA_COSTS = {"search": 100, "channels": 1, "playlistItems": 1, "videos": 1}
+DAILY_QUOTA = int(os.getenv("SMARTFUNNEL_YOUTUBE_DAILY_QUOTA", "10000"))
+MAX_REQUESTS_PER_SECOND = float(os.getenv("SMARTFUNNEL_YOUTUBE_QPS", "10"))
+# The quota resets at midnight Pacific time
+QUOTA_TIMEZONE = ZoneInfo("America/Los_Angeles")
+DEFAULT_CHANNEL_TTL_SECONDS = 30 * 24 * 3600
+# Requests in flight at once, which is also the size of the connection pool
+DEFAULT_MAX_WORKERS = int(os.getenv("SMARTFUNNEL_YOUTUBE_WORKERS", "4"))
+MAX_RETRIES = int(os.getenv("SMARTFUNNEL_YOUTUBE_RETRIES", "4"))
+BACKOFF_SECONDS = 1.0
+REQUEST_TIMEOUT_SECONDS = 30
+# Error reasons of a 403 that clear up by slowing down; others (notably
+# quotaExceeded) fail the same way until the quota resets
+RETRYABLE_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+_CHANNEL_ID = re.compile(r"^UC[\w-]{22}$")
+_DURATION = re.compile(r"^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+class QuotaExhausted(Exception):
+    """The request would exceed the daily YouTube Data API quota."""
+
+
+class QuotaPacer:
+    """
+    Persistent count of the quota units spent per (Pacific) day, and a
+    minimum spacing between requests.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        daily_quota: int = DAILY_QUOTA,
+        max_requests_per_second: float = MAX_REQUESTS_PER_SECOND,
+    ):
+        self.path = str(path or data_path("youtube_quota.sqlite3"))
+        self.daily_quota = daily_quota
+        self.interval = 1.0 / max_requests_per_second if max_requests_per_second > 0 else 0.0
+        self._next_request = 0.0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS youtube_quota (day TEXT PRIMARY KEY, units INTEGER NOT NULL)"
+            )
+
+    def _today(self) -> str:
+        return datetime.now(QUOTA_TIMEZONE).date().isoformat()
+
+    def used(self) -> int:
+        with self._lock:
+            row = self._conn.execute("SELECT units FROM youtube_quota WHERE day = ?", (self._today(),)).fetchone()
+        return row[0] if row else 0
+
+    def remaining(self) -> int:
+        return self.daily_quota - self.used()
+
+    def acquire(self, endpoint: str):
+        """Charge the quota cost of a request, waiting for its slot under the rate ceiling."""
+        cost = QUOTA_COSTS.get(endpoint, 1)
+        with self._lock:
+            day = self._today()
+            row = self._conn.execute("SELECT units FROM youtube_quota WHERE day = ?", (day,)).fetchone()
+            used = row[0] if row else 0
+            if used + cost > self.daily_quota:
+                raise QuotaExhausted(
+                    f"YouTube {endpoint} needs {cost} units, {self.daily_quota - used} of {self.daily_quota} left today"
+                )
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO youtube_quota (day, units) VALUES (?, ?) "
+                    "ON CONFLICT(day) DO UPDATE SET units = units + excluded.units",
+                    (day, cost),
+                )
+            now = time.monotonic()
+            wait = self._next_request - now
+            self._next_request = max(now, self._next_request) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+_pacer: Optional[QuotaPacer] = None
+
+
+def get_quota_pacer() -> QuotaPacer:
+    """Return the process-wide quota pacer."""
+    global _pacer
+    if _pacer is None:
+        _pacer = QuotaPacer()
+    return _pacer
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide keep-alive session, pooling a connection per worker."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            _session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=DEFAULT_MAX_WORKERS))
+        return _session
+
+
+def error_reasons(response: requests.Response) -> List[str]:
+    """Reasons listed in a Data API error body, e.g. ["quotaExceeded"]."""
+    try:
+        errors = response.json().get("error", {}).get("errors", [])
+    except (ValueError, AttributeError):
+        return []
+    return [error.get("reason", "") for error in errors if isinstance(error, dict)]
+
+
+def _is_retryable(response: requests.Response) -> bool:
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        return True
+    return response.status_code == 403 and bool(RETRYABLE_REASONS & set(error_reasons(response)))
+
+
+def _backoff(response: requests.Response, attempt: int) -> float:
+    retry_after = response.headers.get("Retry-After", "")
+    if retry_after.isdigit():
+        return float(retry_after)
+    # Full jitter keeps concurrent workers from retrying in lockstep
+    return random.uniform(0, BACKOFF_SECONDS * 2 ** attempt)
+
+
+def youtube_get(endpoint: str, params: Dict[str, Any], api_key: str) -> Dict[str, Any]:
+    """
+    GET a Data API list endpoint (e.g. "playlistItems") and return its JSON
+    body. Rate-limit and server errors are retried up to MAX_RETRIES times;
+    an exhausted quota raises QuotaExhausted without retrying.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        get_quota_pacer().acquire(endpoint)
+        with track("http", f"youtube.{endpoint}") as call:
+            response = get_session().get(
+                f"{API_URL}/{endpoint}", params={**params, "key": api_key}, timeout=REQUEST_TIMEOUT_SECONDS
+            )
+            call.bytes = len(response.content)
+            if not response.ok:
+                call.error = f"HTTP {response.status_code}"
+        if response.ok:
+            return response.json()
+        logger.error(f"YouTube {endpoint} request failed ({response.status_code}): {response.text[:500]}")
+        reasons = error_reasons(response)
+        if "quotaExceeded" in reasons or "dailyLimitExceeded" in reasons:
+            raise QuotaExhausted(f"YouTube API quota exceeded for {endpoint}: {', '.join(reasons)}")
+        if attempt == MAX_RETRIES or not _is_retryable(response):
+            break
+        delay = _backoff(response, attempt)
+        logger.warning(f"Retrying YouTube {endpoint} in {delay:.1f}s (attempt {attempt + 2} of {MAX_RETRIES + 1})")
+        time.sleep(delay)
+    response.raise_for_status()
+    return response.json()
+
+
+def youtube_get_many(
+    endpoint: str, params_list: Sequence[Dict[str, Any]], api_key: str, max_workers: int = DEFAULT_MAX_WORKERS
+) -> List[Dict[str, Any]]:
+    """youtube_get for each params, at most max_workers at a time. Returns the bodies in order."""
+    if not params_list:
+        return []
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(params_list))) as executor:
+        return list(executor.map(bind_run(lambda params: youtube_get(endpoint, params, api_key)), params_list))
+
+
+def uploads_playlist_id(channel_id: str, api_key: str) -> str:
+    """Id of the playlist holding every upload of a channel."""
+    # The uploads playlist of channel UCxxxx is UUxxxx, which saves a request
+    if channel_id.startswith("UC"):
+        return "UU" + channel_id[2:]
+    items = youtube_get("channels", {"part": "contentDetails", "id": channel_id}, api_key).get("items", [])
+    if not items:
+        raise ValueError(f"No channel found for id {channel_id}")
+    return items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
+
+
+def parse_duration(duration: str) -> int:
+    """Seconds of an ISO 8601 video duration such as "PT1H2M10S" (0 for live streams or unknown formats)."""
+    match = _DURATION.match(duration or "")
+    if not match:
+        return 0
+    days, hours, minutes, seconds = (int(value or 0) for value in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def normalize_handle(handle: str) -> str:
+    """Cache key of a handle: "@Name", "Name" and "https://www.youtube.com/@Name/videos" give "@name"."""
+    handle = handle.strip()
+    match = re.search(r"youtube\.com/(@[^/?#]+)", handle)
+    if match:
+        handle = match.group(1)
+    return "@" + handle.lstrip("@").lower()
+
+
+class ChannelIdCache:
+    """Persistent handle -> channel id mappings that expire after ttl_seconds."""
+
+    def __init__(self, path: Optional[str] = None, ttl_seconds: int = DEFAULT_CHANNEL_TTL_SECONDS):
+        self.path = str(path or data_path("youtube_channels.sqlite3"))
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS channel_ids ("
+                " handle TEXT PRIMARY KEY,"
+                " channel_id TEXT NOT NULL,"
+                " resolved_at REAL NOT NULL)"
+            )
+
+    def get(self, handle: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT channel_id FROM channel_ids WHERE handle = ? AND resolved_at >= ?",
+                (handle, time.time() - self.ttl_seconds),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, handle: str, channel_id: str):
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO channel_ids (handle, channel_id, resolved_at) VALUES (?, ?, ?)",
+                    (handle, channel_id, time.time()),
+                )
+
+
+_channel_id_cache: Optional[ChannelIdCache] = None
+
+
+def get_channel_id_cache() -> ChannelIdCache:
+    """Return the process-wide handle -> channel id cache."""
+    global _channel_id_cache
+    if _channel_id_cache is None:
+        _channel_id_cache = ChannelIdCache()
+    return _channel_id_cache
+
+
+def resolve_channel_id(handle: str, api_key: str) -> str:
+    """
+    Channel id of a handle (or an id, returned as is). Handles are looked up
+    exactly with channels.list?forHandle (1 unit) and cached, so repeat
+    lookups cost nothing. search.list (100 units) is only the fallback for
+    names that are not handles.
+    """
+    if _CHANNEL_ID.match(handle.strip()):
+        return handle.strip()
+    key = normalize_handle(handle)
+    cache = get_channel_id_cache()
+    channel_id = cache.get(key)
+    if channel_id:
+        return channel_id
+
+    items = youtube_get("channels", {"part": "id", "forHandle": key}, api_key).get("items", [])
+    if items:
+        channel_id = items[0]["id"]
+    else:
+        logger.warning(f"No channel has the handle {key}, searching for it instead")
+        items = youtube_get(
+            "search", {"part": "snippet", "type": "channel", "q": handle.strip(), "maxResults": 1}, api_key
+        ).get("items", [])
+        if not items:
+            raise ValueError(f"No channel found for handle {handle}")
+        channel_id = items[0]["id"]["channelId"]
+    cache.put(key, channel_id)
+    logger.info(f"Resolved {key} to channel {channel_id}")
+    return channel_id